@@ -1,6 +1,19 @@
 from .utils import *
+from .cache import *
 from .plot import *
 from .metrics import *
 from .figures import *
 from .jupyter_tools import *
 from .controllers import *
+from .tuning import *
+from .margins import *
+from .modal import *
+from .montecarlo import *
+from .rlocus_index import *
+from .loop import *
+from .discretize import *
+from .reduction import *
+from .frd import *
+from .shared import *
+from .batch import *
+from .analysis import *
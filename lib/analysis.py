@@ -0,0 +1,153 @@
+import hashlib
+import numpy as np
+import scipy.linalg
+import control as ctl
+from scipy import signal
+from .cache import bode_response, feedback_poles, lti_response, time_response, rlocus_response, is_cached
+from .core import pole_info
+from .modal import Modal_Response
+from .frd import FRD_Data
+
+
+def vector_key(vector):
+    """ Get a memoization key for an optional omega, gain or time vector """
+    if vector is None:
+        return None
+    array = np.ascontiguousarray(vector, dtype=float)
+    return hashlib.sha1(array.tobytes()).hexdigest()
+
+
+def as_analysis(sys):
+    """ Get the SystemAnalysis of a transfer function (SystemAnalysis and FRD_Data objects are returned unchanged) """
+    if isinstance(sys, (SystemAnalysis, FRD_Data)):
+        return sys
+    return SystemAnalysis(sys)
+
+
+class SystemAnalysis():
+    """Lazy, memoized analysis of a SISO transfer function
+
+        Poles, zeros, state space, responses, margins and modal table are computed on
+        first access only, and reused by all the figures and metrics the object is
+        passed to (instead of a transfer function).
+        """
+
+    def __init__(self, tf):
+        self.tf = tf
+        self.dt = tf.dt
+        self.memo = {}
+
+    def memoize(self, key, compute):
+        if key not in self.memo:
+            self.memo[key] = compute()
+        return self.memo[key]
+
+    @property
+    def isctime(self):
+        """ Continuous-time system (ctl.isctime: dt is None, or 0 with python-control >= 0.9) """
+        return ctl.isctime(self.tf)
+
+    @property
+    def Te(self):
+        """ Sample period (s), None for a continuous-time system """
+        return None if self.isctime else self.dt
+
+    @property
+    def num(self):
+        return self.tf.num
+
+    @property
+    def den(self):
+        return self.tf.den
+
+    @property
+    def poles(self):
+        return self.memoize("poles", self.tf.pole)
+
+    @property
+    def zeros(self):
+        return self.memoize("zeros", self.tf.zero)
+
+    def pole(self):
+        return self.poles
+
+    def zero(self):
+        return self.zeros
+
+    @property
+    def lti(self):
+        """ scipy lti/dlti system (see Figure.get_sys) """
+        def compute():
+            num = self.tf.num[0][0]
+            den = self.tf.den[0][0]
+            if self.isctime:
+                return signal.lti(num, den)
+            return signal.dlti(num, den, dt=self.dt)
+        return self.memoize("lti", compute)
+
+    @property
+    def ss(self):
+        """ State space realization, balanced with a diagonal similarity transform """
+        def compute():
+            sys_ss = ctl.tf2ss(self.tf)
+            A, B, C, D = (np.asarray(M) for M in (sys_ss.A, sys_ss.B, sys_ss.C, sys_ss.D))
+            if A.shape[0] > 0:
+                _, (scale, _) = scipy.linalg.matrix_balance(A, permute=False, separate=True)
+                A = A * scale[None, :] / scale[:, None]
+                B = B / scale[:, None]
+                C = C * scale[None, :]
+            if self.isctime:
+                return ctl.ss(A, B, C, D)
+            return ctl.ss(A, B, C, D, self.dt)
+        return self.memoize("ss", compute)
+
+    @property
+    def margins(self):
+        """ Gain margin (abs), phase margin (deg), stability margin and their frequencies (rad/s) """
+        def compute():
+            gm, pm, sm, wg, wp, ws = ctl.stability_margins(self.tf)
+            return {"gm": gm, "pm": pm, "sm": sm, "wg": wg, "wp": wp, "ws": ws}
+        return self.memoize("margins", compute)
+
+    @property
+    def modal(self):
+        """ Modal table: natural frequency wn (rad/s) and damping m of each pole """
+        def compute():
+            table = []
+            for pole in self.poles.astype(complex):
+                wn, m = pole_info(pole, dt=self.Te)
+                table.append({"pole": pole, "wn": wn, "m": m})
+            return table
+        return self.memoize("modal", compute)
+
+    def freqresp(self, w=None, arrays=None):
+        """ Get the magnitude (abs), phase (rad) and frequencies of the frequency response (arrays: already computed response to store) """
+        return self.memoize(("freqresp", vector_key(w)), lambda: bode_response(self.tf, w, arrays))
+
+    def lti_response(self, type="step", T=None, arrays=None):
+        """ Get the step or impulse response computed with scipy (Time_Figure) """
+        return self.memoize(("lti_response", type, vector_key(T)), lambda: lti_response(self.tf, self.lti, type, T, arrays))
+
+    def time_response(self, type="step", T=None):
+        """ Get the step or impulse response computed with the control library (plot.step, plot.impulse) """
+        return self.memoize(("time_response", type, vector_key(T)), lambda: time_response(self.tf, type, T))
+
+    def step(self, T=None):
+        return self.lti_response("step", T)
+
+    def modal_response(self, type="step"):
+        return self.memoize(("modal_response", type), lambda: Modal_Response(self.tf, type))
+
+    def feedback_poles(self, k_vect, arrays=None):
+        return self.memoize(("feedback_poles", vector_key(k_vect)), lambda: feedback_poles(self.tf, k_vect, arrays))
+
+    def is_stored(self, response, vector, type="step"):
+        """ Check whether a "freqresp", "lti_response" or "feedback_poles" response on vector is memoized or in the disk cache, without computing it """
+        if response == "lti_response":
+            memo_key, kind = ("lti_response", type, vector_key(vector)), "lti_" + type
+        else:
+            memo_key, kind = (response, vector_key(vector)), {"freqresp": "bode", "feedback_poles": "feedback_poles"}[response]
+        return memo_key in self.memo or is_cached(kind, self.tf, vector)
+
+    def rlocus(self, k_vect):
+        return self.memoize(("rlocus", vector_key(k_vect)), lambda: rlocus_response(self.tf, k_vect))
@@ -0,0 +1,77 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from .analysis import as_analysis
+from .shared import Shared_Arrays, attach
+
+
+def horner(coefs, s):
+    """ Evaluate the polynomials of the rows of coefs (decreasing powers) at the points s (nb_rows x nb_points) """
+    value = np.zeros(s.shape, dtype=complex)
+    for index in range(coefs.shape[1]):
+        value = value * s + coefs[:, index:index + 1]
+    return value
+
+
+def evaluate_freqresp(num, den, dt, w):
+    """ Get the complex responses of the systems num/den (rows, dt=0 for continuous-time) on w """
+    s = np.tile(1j * w, (len(dt), 1))
+    discrete = dt > 0
+    s[discrete] = np.exp(1j * np.outer(dt[discrete], w))
+    return horner(num, s) / horner(den, s)
+
+
+def freqresp_chunk(specs, start, stop):
+    """ Compute the responses of the systems start:stop in a worker, from and to shared memory """
+    with attach(specs) as arrays:
+        arrays["H"][start:stop] = evaluate_freqresp(arrays["num"][start:stop], arrays["den"][start:stop], arrays["dt"][start:stop], arrays["w"])
+    return stop - start
+
+
+def batch_freqresp(tf_list, w, n_jobs=None, chunk_size=None):
+    """Frequency responses of many SISO systems on a common grid
+
+        The padded numerator and denominator coefficients, the sample periods and w are
+        published once in shared memory (see shared.Shared_Arrays), and each worker
+        writes the responses of a range of systems directly into a shared output buffer,
+        so that neither the systems nor the responses are pickled.
+
+        Parameters
+        ----------
+        tf_list : list of transfer functions or SystemAnalysis
+        w : array-like
+        Frequency grid (rad/s).
+        n_jobs : int, optional
+        Number of worker processes (1 to evaluate in the current process).
+        chunk_size : int, optional
+        Number of systems per task, by default the systems are split evenly between the workers.
+        Returns
+        -------
+        mag (abs), phase (rad, unwrapped along w), arrays (nb_systems x nb_w)
+        """
+    w = np.asarray(w, dtype=float)
+    analysis_list = [as_analysis(tf) for tf in tf_list]
+    num_list = [np.atleast_1d(np.squeeze(analysis.num[0][0])) for analysis in analysis_list]
+    den_list = [np.atleast_1d(np.squeeze(analysis.den[0][0])) for analysis in analysis_list]
+    order = max(len(coefs) for coefs in num_list + den_list)
+    num = np.array([np.pad(coefs, (order - len(coefs), 0)) for coefs in num_list], dtype=float)
+    den = np.array([np.pad(coefs, (order - len(coefs), 0)) for coefs in den_list], dtype=float)
+    dt = np.array([0 if analysis.isctime else analysis.dt for analysis in analysis_list], dtype=float)
+
+    if n_jobs == 1:
+        H = evaluate_freqresp(num, den, dt, w)
+    else:
+        n_workers = n_jobs or os.cpu_count() or 1
+        if chunk_size is None:
+            chunk_size = int(np.ceil(len(tf_list) / n_workers))
+        with Shared_Arrays() as shared:
+            for key, array in (("num", num), ("den", den), ("dt", dt), ("w", w)):
+                shared.publish(key, array)
+            shared.allocate("H", (len(tf_list), len(w)), complex)
+            with ProcessPoolExecutor(n_jobs) as executor:
+                futures = [executor.submit(freqresp_chunk, shared.specs, start, min(start + chunk_size, len(tf_list))) for start in range(0, len(tf_list), chunk_size)]
+                for future in futures:
+                    future.result()
+            H = np.array(shared["H"])
+
+    return np.abs(H), np.unwrap(np.angle(H), axis=1)
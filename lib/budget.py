@@ -0,0 +1,64 @@
+import time
+import numpy as np
+
+# (n_min, n_max) explored for each kind of resolution, the resolutions are n_min*GROWTH^k (see ladder)
+BUDGET_LIMITS = {
+    "freqresp": (64, 16384),
+    "time": (64, 16384),
+    "rlocus": (32, 4096),
+    "grid": (64, 2048),
+}
+GROWTH = 2  # ratio of two consecutive resolutions of the ladder
+BUDGET_SHARE = 0.5  # fraction of the remaining figure budget given to each plot or grid call
+
+
+def cost_model(timings):
+    """ Fit the cost t(n) = a + b*n (s) on a list of (n, seconds) timings (a = 0 with a single timing) """
+    n, t = np.array(timings, dtype=float).T
+    if np.ptp(n) == 0:
+        return 0.0, np.max(t / n)
+    b, a = np.polyfit(n, t, 1)
+    if b <= 0:
+        return 0.0, np.max(t / n)
+    return max(a, 0.0), b
+
+
+def ladder(n_min, n_max):
+    """ Get the resolutions n_min*GROWTH^k up to n_max: the same few grids are chosen from run to run, so that they are found in the memo and the disk cache """
+    steps = [n_min]
+    while steps[-1] * GROWTH <= n_max:
+        steps.append(steps[-1] * GROWTH)
+    return steps
+
+
+def refine(evaluate, budget_ms, steps):
+    """Progressive refinement of a resolution within a time budget
+
+        evaluate(n) is first timed at the first resolution of steps (see ladder) on the
+        actual system. It must compute the response without the memo and the disk cache,
+        so that the timings are those of the computation and the intermediate resolutions
+        are not stored. A linear cost model is fitted on the timings, and evaluate is
+        called again with the largest resolution of steps the model predicts to fit in
+        the remaining time, as long as it is larger than the last one.
+
+        Returns
+        -------
+        (result, n, elapsed_ms) of the last evaluation
+        """
+    start = time.perf_counter()
+    timings = []
+    index = 0
+    while True:
+        n = steps[index]
+        t0 = time.perf_counter()
+        result = evaluate(n)
+        timings.append((n, time.perf_counter() - t0))
+        if index == len(steps) - 1:
+            break
+        a, b = cost_model(timings)
+        remaining = budget_ms / 1000 - (time.perf_counter() - start)
+        next_index = int(np.searchsorted(steps, (remaining - a) / b, side="right")) - 1
+        if next_index <= index:
+            break
+        index = next_index
+    return result, n, 1000 * (time.perf_counter() - start)
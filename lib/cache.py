@@ -0,0 +1,231 @@
+import os
+import shutil
+import hashlib
+import uuid
+import numpy as np
+import control as ctl
+
+try:
+    import fcntl
+except ImportError:  # not available on windows, eviction is then not serialized
+    fcntl = None
+
+CACHE_VERSION = 2
+DEFAULT_MAX_SIZE = 2 * 1024 ** 3  # bytes
+
+_cache = None
+
+
+def set_cache(path, max_size=DEFAULT_MAX_SIZE):
+    """Enable the on-disk response cache used by the figures and plot functions
+
+        Parameters
+        ----------
+        path : str
+        Cache directory (set to None to disable the cache).
+        max_size : int
+        Maximum total size of the cached arrays (bytes). The least recently used
+        responses are evicted above this size.
+        """
+    global _cache
+    if path is None:
+        _cache = None
+    else:
+        _cache = Response_Cache(path, max_size)
+    return _cache
+
+
+def get_cache():
+    return _cache
+
+
+class Response_Cache():
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self.size_estimate = None  # total size seen by this process, synchronized by each evict scan
+        os.makedirs(os.path.join(path, "tmp"), exist_ok=True)
+
+    def key(self, kind, tf, vector=None):
+        """ Get the content hash of a response (num/den coefficients, dt and omega, gain or time vector), each array is prefixed with its shape """
+        h = hashlib.sha256()
+        h.update("{}:{}:{}".format(CACHE_VERSION, kind, tf.dt).encode())
+        for array in (tf.num[0][0], tf.den[0][0], vector):
+            if array is None:
+                h.update(b"|none")
+                continue
+            array = np.ascontiguousarray(array, dtype=float)
+            h.update("|{}:".format(array.shape).encode())
+            h.update(array.tobytes())
+        return h.hexdigest()
+
+    def get_entry_path(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key):
+        """ Get the memory-mapped arrays of a response, or None if the response is not cached """
+        entry_path = self.get_entry_path(key)
+        try:
+            arrays = {}
+            for filename in os.listdir(entry_path):
+                if filename.endswith(".npy"):
+                    arrays[filename[:-4]] = np.load(os.path.join(entry_path, filename), mmap_mode="r")
+            os.utime(entry_path)  # mark as recently used
+        except (FileNotFoundError, ValueError):
+            return None  # not cached, or evicted by another process while reading
+        return arrays
+
+    def set(self, key, arrays):
+        """Store a response (dict of arrays); the entry appears atomically to the other processes
+
+            The directory is only scanned (see evict) when the running size estimate
+            exceeds max_size, instead of after each write.
+            """
+        tmp_path = os.path.join(self.path, "tmp", "{}.{}".format(key, uuid.uuid4().hex))
+        os.makedirs(tmp_path)
+        size = 0
+        for name, array in arrays.items():
+            file_path = os.path.join(tmp_path, name + ".npy")
+            np.save(file_path, np.asarray(array))
+            size += os.path.getsize(file_path)
+
+        entry_path = self.get_entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        try:
+            os.rename(tmp_path, entry_path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)  # already stored by another process
+            return
+        if self.size_estimate is None:
+            self.size_estimate = self.size()
+        else:
+            self.size_estimate += size
+        if self.size_estimate > self.max_size:
+            self.evict()
+
+    def get_entries(self):
+        entries = []
+        for prefix in os.listdir(self.path):
+            if len(prefix) != 2:
+                continue
+            prefix_path = os.path.join(self.path, prefix)
+            for key in os.listdir(prefix_path):
+                entry_path = os.path.join(prefix_path, key)
+                try:
+                    size = sum(entry.stat().st_size for entry in os.scandir(entry_path))
+                    entries.append((os.stat(entry_path).st_mtime, size, entry_path))
+                except FileNotFoundError:
+                    pass
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.get_entries())
+
+    def evict(self):
+        """ Remove the least recently used responses until the cache fits in max_size """
+        with open(os.path.join(self.path, "lock"), "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            entries = sorted(self.get_entries())
+            total_size = sum(size for _, size, _ in entries)
+            for _, size, entry_path in entries:
+                if total_size <= self.max_size:
+                    break
+                # rename first so that readers never see a partially removed entry
+                tmp_path = os.path.join(self.path, "tmp", "evicted." + uuid.uuid4().hex)
+                try:
+                    os.rename(entry_path, tmp_path)
+                except OSError:
+                    continue
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                total_size -= size
+            self.size_estimate = total_size
+
+    def clear(self):
+        for prefix in os.listdir(self.path):
+            if len(prefix) == 2:
+                shutil.rmtree(os.path.join(self.path, prefix), ignore_errors=True)
+        self.size_estimate = 0
+
+
+def is_cached(kind, tf, vector=None):
+    """ Check whether a response is in the cache, without loading it """
+    return _cache is not None and os.path.isdir(_cache.get_entry_path(_cache.key(kind, tf, vector)))
+
+
+def cached(kind, tf, compute, vector=None):
+    """ Get a response from the cache if enabled, otherwise (or on a miss) compute it """
+    if _cache is None:
+        return compute()
+
+    key = _cache.key(kind, tf, vector)
+    arrays = _cache.get(key)
+    if arrays is None:
+        arrays = compute()
+        _cache.set(key, arrays)
+    return arrays
+
+
+# Cached responses
+# the *_arrays functions compute a response without the cache, the *_response functions
+# store the given arrays (already computed, see Figure.budget_resolution) on a miss
+
+def bode_arrays(tf, w=None):
+    mag, phase, w_out = ctl.bode_plot(tf, omega=w, Plot=False, omega_limits=None, omega_num=None, margins=None)
+    return {"mag": mag, "phase": phase, "w": w_out}
+
+
+def bode_response(tf, w=None, arrays=None):
+    compute = (lambda: arrays) if arrays is not None else (lambda: bode_arrays(tf, w))
+    arrays = cached("bode", tf, compute, w)
+    return arrays["mag"], arrays["phase"], arrays["w"]
+
+
+def feedback_poles_arrays(tf, k_vect):
+    poles = [ctl.feedback(k * tf, 1).pole() for k in k_vect]
+    return {"poles": np.array(poles)}
+
+
+def feedback_poles(tf, k_vect, arrays=None):
+    """ Get the closed-loop poles of feedback(k*tf,1) for each gain of k_vect """
+    compute = (lambda: arrays) if arrays is not None else (lambda: feedback_poles_arrays(tf, k_vect))
+    return cached("feedback_poles", tf, compute, k_vect)["poles"]
+
+
+def rlocus_response(tf, k_vect):
+    def compute():
+        r_list, k_list = ctl.rlocus(tf, k_vect, Plot=False)
+        return {"roots": r_list, "gains": k_list}
+
+    arrays = cached("rlocus", tf, compute, k_vect)
+    return arrays["roots"], arrays["gains"]
+
+
+def lti_arrays(tf, sys, type="step", T=None):
+    time_args = {"T": T} if ctl.isctime(tf) else {"t": T}
+    if type == "step":
+        t, s = sys.step(**time_args)
+    else:
+        t, s = sys.impulse(**time_args)
+    return {"t": np.ravel(t), "s": np.ravel(s)}
+
+
+def lti_response(tf, sys, type="step", T=None, arrays=None):
+    """ Get the step or impulse response of a scipy lti/dlti system built from tf """
+    compute = (lambda: arrays) if arrays is not None else (lambda: lti_arrays(tf, sys, type, T))
+    arrays = cached("lti_" + type, tf, compute, T)
+    return arrays["t"], arrays["s"]
+
+
+def time_response(tf, type="step", T=None):
+    """ Get the step or impulse response computed with the control library """
+    def compute():
+        if type == "step":
+            t, y = ctl.step_response(tf, T=T)
+        else:
+            t, y = ctl.impulse_response(tf, T=T)
+        return {"t": np.ravel(t), "y": np.ravel(y)}
+
+    arrays = cached(type, tf, compute, T)
+    return arrays["t"], arrays["y"]
@@ -2,3 +2,7 @@ from control import tf
 
 def pi(Ki,Ti):
     return tf([Ki*Ti,Ki],[Ti,0])
+
+def dpi(Ki,Ti,Te):
+    """ Discrete PI controller C(z) = Ki + Ki*(Te/Ti)*z/(z-1) (same form as Nichols_Interact) """
+    return Ki+Ki*tf([Te/Ti,0],[1,-1],Te)
@@ -0,0 +1,114 @@
+import numpy as np
+import scipy.linalg
+import control as ctl
+from .analysis import as_analysis
+
+EIG_COND_MAX = 1e8  # above this condition number of the eigenvectors, each Te falls back to expm
+
+
+class Discrete_Batch():
+    """ Zero-order-hold models of one continuous plant for a vector of sample periods Te """
+
+    def __init__(self, Te_list, systems):
+        self.Te_list = np.asarray(Te_list, dtype=float)
+        self.systems = systems
+
+    def __len__(self):
+        return len(self.systems)
+
+    def __iter__(self):
+        return iter(zip(self.Te_list, self.systems))
+
+    def __getitem__(self, index):
+        return self.systems[index]
+
+    def labels(self, label="Te"):
+        return ["{} = {:.4g}".format(label, Te) for Te in self.Te_list]
+
+
+def phi(x):
+    """ (exp(x)-1)/x, equal to 1 at x=0 """
+    x = np.asarray(x, dtype=complex)
+    small = np.abs(x) < 1e-8
+    with np.errstate(divide="ignore", invalid="ignore"):
+        value = np.expm1(x) / x
+    return np.where(small, 1 + x / 2, value)
+
+
+def modal_tf(z, gains, d):
+    """ Get the (num, den) coefficients of d + sum_i gains_i / (z - z_i) """
+    den = np.poly(z).astype(complex)
+    num = d * den
+    for z_i, gain in zip(z, gains):
+        quotient, _ = np.polydiv(den, [1, -z_i])
+        num[1:] += gain * quotient
+    return np.real(num), np.real(den)
+
+
+def ss_numerator(Ad, Bd, C, d, den):
+    """Get the numerator coefficients of C (zI-Ad)^-1 Bd + d, knowing the denominator
+
+        adj(zI-Ad) Bd = sum_k z^(n-1-k) v_k with v_0 = Bd and v_k = Ad v_(k-1) + den_k Bd
+        (Faddeev-LeVerrier recurrence), so that no eigenvalue problem is solved.
+        """
+    num = d * den
+    v = Bd[:, 0]
+    for k in range(1, len(den)):
+        num[k] += C[0] @ v
+        v = Ad @ v + den[k] * Bd[:, 0]
+    return num
+
+
+def c2d_batch(sys, Te_list):
+    """Zero-order-hold discretization of a continuous plant for several sample periods
+
+        The (balanced) state matrix A is diagonalized once, A = V diag(l) V^-1, so that
+        for each Te
+
+        Ad = V diag(exp(l Te)) V^-1,  Bd = V diag(Te phi(l Te)) V^-1 B
+
+        only costs a few small matrix products. The transfer functions are built from the
+        modal form: the poles are exp(l Te), and the residues (C V)_i (Bd)_i. When A is
+        defective or its eigenvectors are ill-conditioned, each model is computed with
+        the matrix exponential instead (the poles are still exp(l Te)).
+
+        Parameters
+        ----------
+        sys : continuous transfer function or SystemAnalysis
+        Te_list : array-like
+        Sample periods (s).
+        Returns
+        -------
+        Discrete_Batch of discrete transfer functions (see Figure.plot_batch)
+        """
+    analysis = as_analysis(sys)
+    if not analysis.isctime:
+        raise ValueError("c2d_batch requires a continuous-time system")
+    A, B, C, D = (np.asarray(M, dtype=float) for M in (analysis.ss.A, analysis.ss.B, analysis.ss.C, analysis.ss.D))
+    n = A.shape[0]
+
+    use_eig = False
+    if n > 0:
+        eigenvalues, V = scipy.linalg.eig(A)
+        use_eig = np.linalg.cond(V) < EIG_COND_MAX
+    if use_eig:
+        V_inv_B = np.linalg.solve(V, B)[:, 0]
+        C_V = (C @ V)[0]
+
+    systems = []
+    for Te in np.asarray(Te_list, dtype=float):
+        if n == 0:
+            systems.append(ctl.tf(analysis.num, analysis.den, Te))
+            continue
+        z = np.exp(eigenvalues * Te)
+        if use_eig:
+            num, den = modal_tf(z, C_V * Te * phi(eigenvalues * Te) * V_inv_B, D[0, 0])
+        else:
+            M = np.zeros((n + 1, n + 1))
+            M[:n, :n] = A * Te
+            M[:n, n:] = B * Te
+            E = scipy.linalg.expm(M)
+            den = np.real(np.poly(z))
+            num = ss_numerator(E[:n, :n], E[:n, n:], C, D[0, 0], den)
+        systems.append(ctl.tf(num, den, Te))
+    return Discrete_Batch(Te_list, systems)
@@ -1,52 +1,95 @@
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import numpy as np
+import control as ctl
 from scipy import signal
-from .utils import nichols_grid
+from .utils import get_T_max, nichols_grid, nichols_grid_viewport, apply_render_mode, check_render_mode, WEBGL_THRESHOLD, trace_fingerprint, trace_patch, pz_density, pz_density_traces, check_density_style, DENSITY_BINS
 from .core import nicchart, rlocus_chart, drlocus_chart,pole_info
-from control import feedback, bode_plot
+from .traces import Trace, Array_Store
+from .analysis import as_analysis, SystemAnalysis
+from .cache import bode_arrays, lti_arrays, feedback_poles_arrays
+from .budget import BUDGET_LIMITS, BUDGET_SHARE, ladder, refine
+from .rlocus_index import Rlocus_Index
+from .loop import loop_analysis, LOOP_FUNCTIONS
+from .reduction import balanced_truncation, approximation
 import plotly
 import json
 
+VIEWPORT_POINTS = 400
 
 
-def figure(type):
+def figure(type,**kwargs):
     if type=="time":
-        fig = Time_Figure()
+        fig = Time_Figure(**kwargs)
     if type == "pzmap":
-        fig = PZmap_Figure()
+        fig = PZmap_Figure(**kwargs)
     if type == "bode":
-        fig = Bode_Figure()
+        fig = Bode_Figure(**kwargs)
     if type == "nichols":
-        fig = Nichols_Figure()
+        fig = Nichols_Figure(**kwargs)
     if type == "rlocus":
-        fig = Rlocus_Figure()
+        fig = Rlocus_Figure(**kwargs)
+    if type == "loop":
+        fig = Loop_Figure(**kwargs)
     return fig
 
 class Figure():
 
     color_list = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#EF553B", "brown"]
+    webgl_threshold = WEBGL_THRESHOLD
     
-    def __init__(self):
+    def __init__(self,render_mode="svg",dtype=None,budget_ms=None):
         self.data = []
+        self.store = Array_Store(dtype)
         self.type = None
         self.layout = None
         self.index = 0
         self.x_range = None
         self.y_range = None
+        self.exported = None
+        self.approximations = []
+        self.budget_ms = budget_ms
+        self.budget_remaining_ms = budget_ms
+        self.resolutions = {}
+        self.set_render_mode(render_mode)
     
     def get_layout(self):
         layout =  { "xaxis": {"title": {"text": ""}},"yaxis": {"title": {"text": ""}}}
         return layout
     
     def get_next_color(self):
-        color = self.color_list[self.index]
+        color = self.color_list[self.index % len(self.color_list)]
         self.index +=1
         return color
     
     def get_grid_line(self):
         return dict(color="#555", width=1, dash="dot")
     
+    def get_envelope_bounds(self,envelope,bounds="minmax"):
+        """ Get the lower and upper curves of a Monte Carlo envelope ("minmax" or a pair of computed percentiles) """
+        if bounds == "minmax":
+            return envelope["min"], envelope["max"]
+        return envelope["percentiles"][bounds[0]], envelope["percentiles"][bounds[1]]
+    
+    def make_band(self,x_lower,y_lower,x_upper,y_upper,color,label):
+        """ Get a filled polygon trace between a lower and an upper curve """
+        data = {"x": np.hstack([x_upper,np.flip(x_lower)]),
+                "y": np.hstack([y_upper,np.flip(y_lower)]),
+                "name": label,
+                "fill": "toself",
+                "fillcolor": color,
+                "opacity": 0.3,
+                "line": dict(color=color, width=0),
+                "hoverinfo": "name",
+                "showlegend": False,
+                }
+        return self.make_trace(data)
+
+    def plot_batch(self,batch,*args,label="Te",**kwargs):
+        """ Overlay the systems of a batch (for instance a discretize.c2d_batch sweep), the other arguments are passed to plot """
+        for sys, sys_label in zip(batch.systems,batch.labels(label)):
+            self.plot(sys,*args,label=sys_label,**kwargs)
+
     def get_line_shape(self,sys):
         if isinstance(sys,signal.dlti):
             line_shape = "hv"
@@ -54,68 +97,191 @@ class Figure():
             line_shape = "linear"
         return line_shape 
     
+    def approximate(self,tf,approx=None,label="sys"):
+        """ Get the balanced truncation of tf for the approx option (int: order, float: error bound) and record its error bound (tf is returned when approx is None) """
+        if approx is None:
+            return tf
+        reduction = balanced_truncation(tf,**approximation(approx))
+        self.approximations.append((label,reduction))
+        return reduction["sys"]
+    
+    def annotate_approximations(self,fig):
+        """ Report the order and error bound of the reduced models in the layout """
+        if len(self.approximations) == 0:
+            return
+        lines = ["{}: order {}, |error| &le; {:.3g}".format(label,reduction["order"],reduction["error_bound"]) for label, reduction in self.approximations]
+        fig.add_annotation(text="<br>".join(lines),xref="paper",yref="paper",x=1,y=1,xanchor="right",yanchor="bottom",align="right",showarrow=False)
+    
+    def budget_resolution(self,kind,label,compute,analysis=None,is_stored=None):
+        """Choose a resolution of the ladder with the budget left for the figure (see budget.refine)
+
+            A resolution already chosen for the same analysis and kind is reused, then
+            the largest resolution whose response is_stored(n) (memo or disk cache).
+            Otherwise, the call is given BUDGET_SHARE of the remaining budget_ms, and the
+            time it spends is drawn from it, so that the whole figure stays within
+            budget_ms. compute(n) must not go through the memo or the cache. The
+            resolution is recorded in resolutions[(kind,label)].
+
+            Returns
+            -------
+            (result of compute(n), or None when the response is already stored, n)
+            """
+        steps = ladder(*BUDGET_LIMITS[kind])
+        n = None
+        if analysis is not None:
+            n = analysis.memo.get(("resolution",kind))
+        if n is None and is_stored is not None:
+            stored = [step for step in steps if is_stored(step)]
+            n = stored[-1] if stored else None
+        if n is not None:
+            result, elapsed = None, 0.0
+        else:
+            result, n, elapsed = refine(compute,self.budget_remaining_ms*BUDGET_SHARE,steps)
+            self.budget_remaining_ms = max(self.budget_remaining_ms-elapsed,0)
+        if analysis is not None:
+            analysis.memo[("resolution",kind)] = n
+        self.resolutions[(kind,label)] = {"n": n,"ms": elapsed}
+        return result, n
+    
+    def get_freqresp(self,tf,w=None,label="sys"):
+        """ Get the frequency response on w, or on a grid sized for budget_ms when w is None """
+        analysis = as_analysis(tf)
+        if w is not None or self.budget_ms is None or not isinstance(analysis,SystemAnalysis):
+            return analysis.freqresp(w)
+        omega = ctl.freqplot.default_frequency_range(analysis.tf)
+        w_min, w_max = np.log10(omega[0]), np.log10(omega[-1])
+        arrays, n = self.budget_resolution("freqresp",label,lambda n: bode_arrays(analysis.tf,np.logspace(w_min,w_max,n)),
+                                           analysis,lambda n: analysis.is_stored("freqresp",np.logspace(w_min,w_max,n)))
+        return analysis.freqresp(np.logspace(w_min,w_max,n),arrays)
+    
     def get_sys(self,tf):
-        num = tf.num[0][0]
-        den = tf.den[0][0]
-        
-        if tf.dt is None:
-            sys = signal.lti(num, den)
-        else :
-            sys = signal.dlti(num,den, dt=tf.dt)
-        return sys
+        return as_analysis(tf).lti
     
     def xlim(self,range):
         self.x_range = range
     
     def ylim(self,range):
         self.y_range = range
+    
+    def set_render_mode(self,render_mode):
+        """ Set the render mode: "svg", "webgl" or "auto" (webgl above webgl_threshold points) """
+        self.render_mode = check_render_mode(render_mode)
+    
+    def make_trace(self,data):
+        """ Convert a plotly dict to a compact Trace (arrays shared in the figure store, optionally as float32) """
+        return Trace.from_dict(data,self.store)
+    
+    def get_data(self):
+        return self.data
+    
+    def get_traces(self):
+        traces = [trace.to_dict() for trace in self.get_data()]
+        return apply_render_mode(traces,self.render_mode,self.webgl_threshold)
 
     def show(self):
-        fig = go.Figure(self.data, layout=self.get_layout())
+        fig = go.Figure(self.get_traces(), layout=self.get_layout())
         
         if self.x_range is not None:
             fig.update_xaxes(range=self.x_range)
         if self.y_range is not None:
             fig.update_yaxes(range=self.y_range)
         
+        self.annotate_approximations(fig)
         return fig
 
     def json(self):
         fig = self.show()
+        self.exported = [trace_fingerprint(trace) for trace in self.get_traces()]
         return json.dumps(fig,cls=plotly.utils.PlotlyJSONEncoder)
 
+    def json_patch(self,since=None):
+        """Get the traces added or modified since the last export (json or json_patch)
+
+            Parameters
+            ----------
+            since : Figure, optional
+            Use the last export of another figure as reference (for instance
+            the previous figure sent to the client).
+            Returns
+            -------
+            json string with the following keys, to be applied in this order
+            with plotly.js:
+            "deleteTraces": indices of the removed traces (Plotly.deleteTraces)
+            "restyle": list of {"update", "indices"} (Plotly.restyle)
+            "extendTraces": list of {"update", "indices"} (Plotly.extendTraces)
+            "addTraces": list of new traces (Plotly.addTraces)
+            """
+        exported = self.exported if since is None else since.exported
+        if exported is None:
+            exported = []
+        
+        traces = self.get_traces()
+        patch = {"deleteTraces": list(range(len(traces),len(exported))),"restyle": [],"extendTraces": [],"addTraces": traces[len(exported):]}
+        for index, trace in enumerate(traces[:len(exported)]):
+            kind, update = trace_patch(trace,exported[index])
+            if kind is not None:
+                update = {key: [value] for key, value in update.items()}
+                patch["extendTraces" if kind == "extend" else "restyle"].append({"update": update,"indices": [index]})
+        
+        self.exported = [trace_fingerprint(trace) for trace in traces]
+        return json.dumps(patch,cls=plotly.utils.PlotlyJSONEncoder)
+
 
 
 class Time_Figure(Figure):
     
+    def __init__(self,**kwargs):
+        super().__init__(**kwargs)
+        self.systems = {}
+    
     def get_layout(self):
         layout =  { "xaxis": {"title": {"text": "time (s)"}},"yaxis": {"title": {"text": "amp"}}}
         return layout
     
-    def plot(self,tf,type="step",T=None,label="sys"):
+    def plot(self,tf,type="step",T=None,label="sys",approx=None):
 
-        if tf.dt is not None:
-            sys_class = "dlti"
-        else:
-            sys_class = "lti"
-
-        sys = self.get_sys(tf)
-        line_shape = self.get_line_shape(sys)
+        analysis = as_analysis(self.approximate(tf,approx,label))
+        line_shape = self.get_line_shape(analysis.lti)
         line = dict(color=self.get_next_color())
         
-        if type == "step":
-            if sys_class == "lti":
-                t,s = sys.step(T=T)
-            else:
-                t,s = sys.step(t=T)
-        if type == "impulse":
-            if sys_class == "lti":
-                t,s = sys.impulse(T=T)
-            else:
-                t,s = sys.impulse(t=T)
+        if T is None and self.budget_ms is not None and analysis.isctime:
+            T_max = get_T_max([analysis])
+            arrays, n = self.budget_resolution("time",label,lambda n: lti_arrays(analysis.tf,analysis.lti,type,np.linspace(0,T_max,n)),
+                                               analysis,lambda n: analysis.is_stored("lti_response",np.linspace(0,T_max,n),type))
+            t,s = analysis.lti_response(type,np.linspace(0,T_max,n),arrays)
+        else:
+            t,s = analysis.lti_response(type,T)
         
         data = {"x":np.ravel(t),"y":np.ravel(s),"line": line,"name":label,"mode":"lines","line_shape":line_shape}
-        self.data.append(data)
+        if analysis.isctime:
+            self.systems[len(self.data)] = (analysis,type)
+        self.data.append(self.make_trace(data))
+
+    def envelope(self,result,bounds="minmax",label="envelope"):
+        """ Draw the step response envelope of a Monte Carlo analysis (montecarlo.monte_carlo result) as a filled band """
+        color = self.get_next_color()
+        t = result["t"]
+        lower, upper = self.get_envelope_bounds(result["step"],bounds)
+        self.data.append(self.make_band(t,lower,t,upper,color,label))
+        data = {"x": t,"y": result["step"]["mean"],"name": "{} mean".format(label),"line": dict(color=color, dash="dash"),"mode": "lines","showlegend": False}
+        self.data.append(self.make_trace(data))
+
+    def show_widget(self,N=500):
+        """ Get a plotly FigureWidget where the continuous-time responses are recomputed exactly (modal form) on the visible time window with N points after each zoom """
+        fig = go.FigureWidget(self.show())
+        responses = {index: analysis.modal_response(type) for index, (analysis,type) in self.systems.items()}
+        
+        def update_responses(layout,x_range):
+            if x_range is None:
+                return
+            t = np.linspace(max(x_range[0],0),x_range[1],N)
+            with fig.batch_update():
+                for index, response in responses.items():
+                    fig.data[index].x = t
+                    fig.data[index].y = response(t)
+        
+        fig.layout.on_change(update_responses,"xaxis.range")
+        return fig
 
 
 class PZmap_Figure(Figure):
@@ -124,10 +290,11 @@ class PZmap_Figure(Figure):
         layout =  { "xaxis": {"title": {"text": "Real Axis"}},"yaxis": {"title": {"text": "Iamg Axis"}, "scaleanchor":"x","scaleratio":1}}
         return layout
 
-    def plot(self,tf,label="sys"):
+    def plot(self,tf,label="sys",approx=None):
+        analysis = as_analysis(self.approximate(tf,approx,label))
         line = dict(color=self.get_next_color())
     
-        p = tf.pole()
+        p = analysis.poles
         data1 =  {  "x": np.real(p),
                     "y": np.imag(p),
                     "name": label,
@@ -137,7 +304,7 @@ class PZmap_Figure(Figure):
                     "marker": {"symbol": "x", "size": 8},
                 }
     
-        z = tf.zero()
+        z = analysis.zeros
         data2 = {   "x": np.real(z),
                     "y": np.imag(z),
                     "name": label,
@@ -147,25 +314,36 @@ class PZmap_Figure(Figure):
                     "marker": {"symbol": "circle", "size": 8},
                 }
         
-        self.data.append(data1)
-        self.data.append(data2)
+        self.data.append(self.make_trace(data1))
+        self.data.append(self.make_trace(data2))
+
+    def density(self,tf_list,bins=DENSITY_BINS,style="heatmap",extent=None,label="sys"):
+        """Add the pole and zero densities of a batch of systems
+
+            The poles and zeros of all the systems are binned into 2-D histograms rendered
+            as heatmap or contour layers (see utils.pz_density_traces), so the payload
+            depends on the number of bins and not on the number of systems.
+            """
+        check_density_style(style)
+        analysis_list = [as_analysis(tf) for tf in tf_list]
+        poles = np.hstack([analysis.poles for analysis in analysis_list] + [[]])
+        zeros = np.hstack([analysis.zeros for analysis in analysis_list] + [[]])
+        density = pz_density(poles, zeros, bins, extent)
+        for data in pz_density_traces(density, style, label):
+            self.data.append(self.make_trace(data))
 
 class Bode_Figure(Figure):
 
-    def __init__(self):
+    def __init__(self,**kwargs):
+        super().__init__(**kwargs)
         self.data_mag = []
         self.data_phase = []
-        self.type = None
-        self.layout = None
-        self.index = 0
-        self.x_range = None
-        self.y_range = None
 
-    def plot(self,tf,w=None,label="sys"):
+    def plot(self,tf,w=None,label="sys",approx=None):
+        tf = self.approximate(tf,approx,label)
         line = dict(color=self.get_next_color())
-        sys = self.get_sys(tf)
         
-        mag_list, phase_list, w = bode_plot(tf, omega=w, Plot=False, omega_limits=None, omega_num=None, margins=None)
+        mag_list, phase_list, w = self.get_freqresp(tf,w,label)
         mag = 20 * np.log10(mag_list)
         phase = phase_list * 180 / np.pi
 
@@ -188,15 +366,34 @@ class Bode_Figure(Figure):
             "showlegend": False,
             }
             
-        self.data_mag.append(data_mag)
-        self.data_phase.append(data_phase)
+        self.data_mag.append(self.make_trace(data_mag))
+        self.data_phase.append(self.make_trace(data_phase))
+
+    def envelope(self,result,bounds="minmax",label="envelope"):
+        """ Draw the magnitude and phase envelopes of a Monte Carlo analysis (montecarlo.monte_carlo result) as filled bands """
+        color = self.get_next_color()
+        w = result["w"]
+        for data_list, key in ((self.data_mag,"mag"),(self.data_phase,"phase")):
+            lower, upper = self.get_envelope_bounds(result[key],bounds)
+            data_list.append(self.make_band(w,lower,w,upper,color,label))
+
+    def get_data(self):
+        return self.data_mag + self.data_phase
+
+    def get_traces(self):
+        traces = super().get_traces()
+        nb_mag = len(self.data_mag)
+        traces = [dict(trace, xaxis="x", yaxis="y") for trace in traces[:nb_mag]] + [dict(trace, xaxis="x2", yaxis="y2") for trace in traces[nb_mag:]]
+        return traces
 
     def show(self):
         fig = make_subplots(rows=2, cols=1, shared_xaxes=True)
         
-        for data in self.data_mag:
+        traces = self.get_traces()
+        nb_mag = len(self.data_mag)
+        for data in traces[:nb_mag]:
             fig.add_trace(data, row=1, col=1)
-        for data in self.data_phase:
+        for data in traces[nb_mag:]:
             fig.add_trace(data, row=2, col=1)
 
         if self.x_range is not None:
@@ -208,27 +405,95 @@ class Bode_Figure(Figure):
         fig.update_xaxes(title_text="w (rad/s)", type="log", row=1, col=1)
         fig.update_yaxes(title_text="Phase", row=2, col=1)
         fig.update_xaxes(title_text="w (rad/s)", type="log", row=2, col=1)
+        self.annotate_approximations(fig)
+        return fig
+
+
+class Loop_Figure(Figure):
+    """ Gang of four (S, T, KS, PS) magnitudes of a feedback loop, see loop.loop_analysis """
+
+    def __init__(self,**kwargs):
+        super().__init__(**kwargs)
+        self.data_loop = {name: [] for name in LOOP_FUNCTIONS}
+        self.results = []
+
+    def plot(self,P,C,w=None,label="sys",approx=None):
+        P = self.approximate(P,approx,label)
+        line = dict(color=self.get_next_color())
+        result = loop_analysis(P,C,w)
+        self.results.append(result)
+        w = result["w"]
+
+        for name in LOOP_FUNCTIONS:
+            data = {
+                "x": w,
+                "y": 20 * np.log10(np.abs(result[name])),
+                "line": line,
+                "name": label,
+                "hovertemplate": "<b>w</b>: %{x:.3f} rad/s<br><b>|"+name+"|</b>: %{y:.3f} dB<br>",
+                "showlegend": False,
+                }
+            self.data_loop[name].append(self.make_trace(data))
+
+        # sensitivity peaks
+        for name, peak, w_peak in (("S","Ms","ws"),("T","Mt","wt")):
+            data = {
+                "x": [result[w_peak]],
+                "y": [20 * np.log10(result[peak])],
+                "line": line,
+                "name": "{} {}".format(label,peak),
+                "mode": "markers",
+                "marker": {"symbol": "circle-open", "size": 10},
+                "hovertemplate": "<b>"+peak+"</b>: %{y:.3f} dB<br><b>w</b>: %{x:.3f} rad/s<br>",
+                "showlegend": False,
+                }
+            self.data_loop[name].append(self.make_trace(data))
+
+    def get_data(self):
+        return [trace for name in LOOP_FUNCTIONS for trace in self.data_loop[name]]
+
+    def get_traces(self):
+        traces = super().get_traces()
+        axes = []
+        for index, name in enumerate(LOOP_FUNCTIONS):
+            suffix = "" if index == 0 else str(index+1)
+            axes += [("x"+suffix, "y"+suffix)] * len(self.data_loop[name])
+        return [dict(trace, xaxis=xaxis, yaxis=yaxis) for trace, (xaxis, yaxis) in zip(traces, axes)]
+
+    def show(self):
+        fig = make_subplots(rows=2, cols=2, shared_xaxes=True, subplot_titles=LOOP_FUNCTIONS)
+
+        for trace in self.get_traces():
+            index = 0 if trace["xaxis"] == "x" else int(trace["xaxis"][1:]) - 1
+            fig.add_trace(trace, row=index//2+1, col=index%2+1)
+
+        if self.x_range is not None:
+            fig.update_xaxes(range=self.x_range)
+        if self.y_range is not None:
+            fig.update_yaxes(range=self.y_range)
+
+        fig.update_xaxes(type="log")
+        fig.update_xaxes(title_text="w (rad/s)", row=2)
+        fig.update_yaxes(title_text="Magnitude", col=1)
+        self.annotate_approximations(fig)
         return fig
 
 
 class Nichols_Figure(Figure):
     
-    def __init__(self):
-        self.data = []
-        self.type = None
-        self.layout = None
-        self.index = 0
+    def __init__(self,**kwargs):
+        super().__init__(**kwargs)
         self.gmin = 1000
+        self.gmax = -1000
         self.pmin = 1000
         self.pmax = -1000
-        self.x_range = None
-        self.y_range = None
+        self.viewport_grid_options = None
         self.add_critical_point()
     
     def add_critical_point(self):
         line = dict(color="#FF0000", width=1)
         data = {"x":[-180],"y":[0],"hoverinfo":"none",  "mode": "markers","marker": {"size": 3,"line":line},"showlegend": False,}
-        self.data.append(data)
+        self.data.append(self.make_trace(data))
     
     def get_layout(self):
         layout =  { "xaxis": {"title": {"text": "Open-Loop Phase (deg)"}},"yaxis": {"title": {"text": "Open-Loop Gain (dB)"}}}
@@ -236,14 +501,15 @@ class Nichols_Figure(Figure):
     
     def update_min_max(self,mag,phase):
         self.gmin = min(np.min(mag),self.gmin)
+        self.gmax = max(np.max(mag),self.gmax)
         self.pmin = min(np.min(phase),self.pmin)
         self.pmax = max(np.max(phase),self.pmax)
     
-    def plot(self,tf,w=None,label="sys"):
+    def plot(self,tf,w=None,label="sys",approx=None):
+        tf = self.approximate(tf,approx,label)
         line = dict(color=self.get_next_color())
-        sys = self.get_sys(tf)
 
-        mag_list, phase_list, w = bode_plot(tf, omega=w, Plot=False, omega_limits=None, omega_num=None, margins=None)
+        mag_list, phase_list, w = self.get_freqresp(tf,w,label)
         mag = 20 * np.log10(mag_list)
         phase = phase_list * 180 / np.pi
 
@@ -258,13 +524,103 @@ class Nichols_Figure(Figure):
             }
         
         self.update_min_max(mag,phase)
-        self.data.append(data)
+        self.data.append(self.make_trace(data))
+
+    def envelope(self,result,bounds="minmax",label="envelope"):
+        """Draw the envelope of a Monte Carlo analysis (montecarlo.monte_carlo result) as a filled band
+
+            The band is the region between the (lower phase, upper gain) and the
+            (upper phase, lower gain) curves.
+            """
+        color = self.get_next_color()
+        mag_lower, mag_upper = self.get_envelope_bounds(result["mag"],bounds)
+        phase_lower, phase_upper = self.get_envelope_bounds(result["phase"],bounds)
+        self.update_min_max(np.hstack([mag_lower,mag_upper]),np.hstack([phase_lower,phase_upper]))
+        self.data.append(self.make_band(phase_upper,mag_lower,phase_lower,mag_upper,color,label))
+
+    def get_data(self):
+        if self.viewport_grid_options is None:
+            return self.data
+        xlim, ylim = self.get_viewport()
+        return self.data + self.get_viewport_grid(xlim,ylim)
+
+    def get_viewport(self):
+        """ Get the visible phase and gain ranges (x_range/y_range if set, otherwise the data extents) """
+        if self.x_range is not None:
+            xlim = self.x_range
+        elif self.pmin <= self.pmax:
+            xlim = [self.pmin-10,self.pmax+10]
+        else:
+            xlim = [-360,0]
+        
+        if self.y_range is not None:
+            ylim = self.y_range
+        elif self.gmin <= self.gmax:
+            ylim = [self.gmin-5,self.gmax+5]
+        else:
+            ylim = [-40,40]
+        return xlim, ylim
+
+    def viewport_grid(self,cl_mags=None,cl_phases=None,show_mag=True,show_phase=True,n_points=None):
+        """Nichols grid generated for the visible range only
+
+            The contours are computed at show time from the viewport (see utils.nichols_grid_viewport).
+            With show_widget, they are regenerated each time the axes ranges change.
+            cl_mags (dB) and cl_phases (deg, in -360..0) follow the nichols_grid conventions.
+            n_points is the number of points of each visible contour, by default VIEWPORT_POINTS
+            or the resolution chosen for budget_ms.
+            """
+        self.viewport_grid_options = {"cl_mags": cl_mags,"cl_phases": cl_phases,"show_mag": show_mag,"show_phase": show_phase,"n_points": n_points}
+
+    def get_viewport_grid(self,xlim,ylim):
+        options = self.viewport_grid_options
+        n_points = options["n_points"]
+        if n_points is None and self.budget_ms is not None:
+            # the resolution is chosen once, and reused on each relayout
+            if ("grid","viewport") not in self.resolutions:
+                self.budget_resolution("grid","viewport",lambda n: nichols_grid_viewport(xlim,ylim,options["cl_mags"],options["cl_phases"],n_points=n))
+            n_points = self.resolutions[("grid","viewport")]["n"]
+        mag_list, phase_list = nichols_grid_viewport(xlim,ylim,options["cl_mags"],options["cl_phases"],n_points=n_points or VIEWPORT_POINTS)
+        contours = []
+        if options["show_mag"] == True:
+            contours += mag_list
+        if options["show_phase"] == True:
+            contours += phase_list
+        
+        # the grid traces are regenerated with the viewport, they do not go to the figure store
+        line = self.get_grid_line()
+        traces = []
+        for contour in contours:
+            data = {"x": contour["x"],"y": contour["y"],"name": contour["name"],"hoverinfo": "name","line": line,"showlegend": False}
+            traces.append(Trace.from_dict(data))
+        return traces
+
+    def show_widget(self):
+        """ Get a plotly FigureWidget whose viewport grid is regenerated on zoom and pan """
+        fig = go.FigureWidget(self.show())
+        if self.viewport_grid_options is None:
+            return fig
+        
+        first_index = len(self.data)
+        def update_grid(layout,x_range,y_range):
+            xlim, ylim = self.get_viewport()
+            if x_range is not None:
+                xlim = x_range
+            if y_range is not None:
+                ylim = y_range
+            traces = self.get_viewport_grid(xlim,ylim)
+            with fig.batch_update():
+                for index, trace in enumerate(traces):
+                    fig.data[first_index+index].x = trace.x
+                    fig.data[first_index+index].y = trace.y
+        
+        fig.layout.on_change(update_grid,"xaxis.range","yaxis.range")
+        return fig
 
     def grid(self,cm=None,cp=None,show_mag=True,show_phase=True):
 
         mag_list, phase_list = nicchart(self.gmin,self.pmin,self.pmax,cm=cm,cp=cp)
         line = self.get_grid_line()
-        data = []
         if show_mag == True:
             for mag in mag_list:
                 data ={
@@ -275,7 +631,7 @@ class Nichols_Figure(Figure):
                     "line": line,
                     "showlegend": False,
                     }
-                self.data.append(data)
+                self.data.append(self.make_trace(data))
 
         if show_phase == True:
             
@@ -288,21 +644,18 @@ class Nichols_Figure(Figure):
                         "line": line,
                         "showlegend": False,
                         }
-                self.data.append(data)
+                self.data.append(self.make_trace(data))
 
-        self.data.append(data)
 
 class Rlocus_Figure(Figure):
     
-    def __init__(self):
-        self.data = []
-        self.type = None
-        self.layout = None
-        self.index = 0
-        self.x_range = None
-        self.y_range = None
+    def __init__(self,**kwargs):
+        super().__init__(**kwargs)
         self.rad_max = 0
         self.sys_class = None
+        self.systems = []
+        self.indexes = {}
+        self.trace_systems = {}
     
     def get_layout(self):
         layout =  { "xaxis": {"title": {"text": "Real Axis"}},"yaxis": {"title": {"text": "Imag Axis"}}}
@@ -329,27 +682,34 @@ class Rlocus_Figure(Figure):
                     "line": line,
                     "showlegend": False,
                     }
-            self.data.append(data)
+            self.data.append(self.make_trace(data))
     
     
-    def plot(self,tf,k_vect=np.logspace(-2,1.2,1000),label="sys"):
+    def plot(self,tf,k_vect=None,label="sys",approx=None):
+        tf = self.approximate(tf,approx,label)
         
         poles = []
         
-        if tf.dt is not None:
-            self.sys_class = "dlti"
-            dt = tf.dt
-        else:
+        analysis = as_analysis(tf)
+        if analysis.isctime:
             self.sys_class = "lti"
-            dt = None
+        else:
+            self.sys_class = "dlti"
+        dt = analysis.Te
         
-        for k in k_vect :
-            tf_cl = feedback(k*tf,1)
-            sys = self.get_sys(tf_cl)
-            poles.append(sys.poles)
+        if k_vect is None and self.budget_ms is not None:
+            arrays, n = self.budget_resolution("rlocus",label,lambda n: feedback_poles_arrays(analysis.tf,np.logspace(-2,1.2,n)),
+                                               analysis,lambda n: analysis.is_stored("feedback_poles",np.logspace(-2,1.2,n)))
+            k_vect = np.logspace(-2,1.2,n)
+            poles = analysis.feedback_poles(k_vect,arrays)
+        else:
+            if k_vect is None:
+                k_vect = np.logspace(-2,1.2,1000)
+            poles = analysis.feedback_poles(k_vect)
+        system = len(self.systems)
+        self.systems.append((analysis,k_vect,poles))
 
         #prepare_data
-        poles = np.array(poles)
         nb_poles = poles.shape[1]
         data = []
         
@@ -372,7 +732,45 @@ class Rlocus_Figure(Figure):
                 custom_data[index,:]= [m,wn]
             
             data = {"x":x,"y":y,"text":k_vect,"name":name,"line":line,"showlegend":False,"customdata":custom_data,"hovertemplate": hovertemplate}
-            self.data.append(data)
+            self.trace_systems[len(self.data)] = system
+            self.data.append(self.make_trace(data))
             
             data = {"x":[x[0]],"y":[y[0]],"line":line, "mode": "markers","marker":{"symbol":"x","size":8},"showlegend":False}
-            self.data.append(data)
+            self.data.append(self.make_trace(data))
+    
+    def get_index(self,system=0):
+        """ Get the Rlocus_Index of a plotted system (built on first use) """
+        if system not in self.indexes:
+            analysis, k_vect, poles = self.systems[system]
+            self.indexes[system] = Rlocus_Index(analysis,k_vect,poles)
+        return self.indexes[system]
+    
+    def gain_at(self,s,system=0):
+        """ Get the gain whose closed-loop poles are the nearest to the complex point s (see Rlocus_Index.gain_at) """
+        return self.get_index(system).gain_at(s)
+    
+    def gain_for(self,m=None,wn=None,system=0):
+        """ Get the gains giving a closed-loop pole with the damping m or the natural frequency wn (see Rlocus_Index.gain_for) """
+        return self.get_index(system).gain_for(m=m,wn=wn)
+    
+    def show_widget(self,on_gain=None):
+        """ Get a plotly FigureWidget where a click on a branch selects the gain: the closed-loop poles are marked and on_gain(result) is called with the gain_at result """
+        fig = go.FigureWidget(self.show())
+        fig.add_scatter(x=[],y=[],mode="markers",marker={"symbol":"circle-open","size":12,"color":"black"},showlegend=False,hoverinfo="skip")
+        selection = fig.data[-1]
+        
+        def select_gain(trace,points,selector):
+            if len(points.point_inds) == 0:
+                return
+            system = self.trace_systems[points.trace_index]
+            result = self.gain_at(points.xs[0]+1j*points.ys[0],system)
+            with fig.batch_update():
+                selection.x = np.real(result["poles"])
+                selection.y = np.imag(result["poles"])
+                fig.layout.title = "K = {:.4g}, m = {:.3f}, wn = {:.3f} rad/s".format(result["K"],result["m"],result["wn"])
+            if on_gain is not None:
+                on_gain(result)
+        
+        for index in self.trace_systems:
+            fig.data[index].on_click(select_gain)
+        return fig
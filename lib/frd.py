@@ -0,0 +1,192 @@
+import os
+import hashlib
+import numpy as np
+from .margins import loop_margins
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+CHUNK_SIZE = 2 ** 24  # bytes (numpy reader), the pandas reader reads CHUNK_SIZE // 16 rows
+DISPLAY_BINS = 2000
+
+
+def parse_chunks(path, usecols=(0, 1, 2), delimiter=",", skiprows=0, chunk_size=CHUNK_SIZE):
+    """Parse the numeric columns of a large text file chunk by chunk
+
+        With pandas, the C parser reads chunks of rows. Otherwise, the file is read in
+        blocks of chunk_size bytes, cut at the last line break, and each block is
+        converted at once with np.fromstring (no object is built per row). A ValueError
+        is raised if a block holds a non-numeric or empty field.
+
+        Returns
+        -------
+        array (nb_rows x len(usecols))
+        """
+    if pandas is not None:
+        reader = pandas.read_csv(path, sep=delimiter, header=None, usecols=list(usecols), skiprows=skiprows,
+                                 dtype=float, engine="c", chunksize=max(chunk_size // 16, 1))
+        chunks = [chunk[list(usecols)].to_numpy() for chunk in reader]
+        return np.vstack(chunks) if chunks else np.empty((0, len(usecols)))
+
+    chunks = []
+    nb_cols = None
+    with open(path, "r") as file:
+        for _ in range(skiprows):
+            file.readline()
+        remainder = ""
+        while True:
+            block = file.read(chunk_size)
+            if not block:
+                break
+            block = remainder + block
+            end = block.rfind("\n") + 1
+            if end == 0:
+                remainder = block
+                continue
+            block, remainder = block[:end], block[end:]
+            if nb_cols is None:
+                nb_cols = len(block[:block.find("\n")].split(delimiter))
+            chunks.append(parse_block(block, delimiter, nb_cols)[:, list(usecols)])
+        if remainder.strip():
+            if nb_cols is None:
+                nb_cols = len(remainder.split(delimiter))
+            chunks.append(parse_block(remainder, delimiter, nb_cols)[:, list(usecols)])
+    return np.vstack(chunks) if chunks else np.empty((0, len(usecols)))
+
+
+def parse_block(block, delimiter, nb_cols):
+    """ Convert the lines of a text block to an array (nb_lines x nb_cols), np.fromstring stops silently at the first invalid value so that the count is checked """
+    block = block.rstrip()
+    nb_rows = block.count("\n") + 1 if block else 0
+    values = np.fromstring(block.replace(delimiter, " "), sep=" ")
+    if values.size != nb_rows * nb_cols:
+        raise ValueError("could not parse {} rows of {} numeric columns (a header line, an empty line, or a non-numeric or empty field?), "
+                         "got {} values".format(nb_rows, nb_cols, values.size))
+    return values.reshape(nb_rows, nb_cols)
+
+
+def decimate(w, values_list, n_bins=DISPLAY_BINS):
+    """Get the indices of the points kept for display
+
+        w is split into n_bins logarithmic bins, and the points of minimum and maximum
+        value of each array of values_list are kept in each bin, so that the peaks and
+        notches of the data survive the decimation.
+        """
+    if len(w) <= 4 * n_bins:
+        return np.arange(len(w))
+    log_w = np.log10(w)
+    edges = np.linspace(log_w[0], log_w[-1], n_bins + 1)
+    starts = np.unique(np.searchsorted(log_w, edges[:-1]))
+    starts = starts[starts < len(w)]
+    counts = np.diff(np.append(starts, len(w)))
+    bins = np.repeat(np.arange(len(starts)), counts)
+
+    keep = [starts]
+    for values in values_list:
+        for reduce in (np.minimum, np.maximum):
+            extremum = np.repeat(reduce.reduceat(values, starts), counts)
+            index = np.flatnonzero(values == extremum)
+            _, first = np.unique(bins[index], return_index=True)
+            keep.append(index[first])
+    return np.unique(np.hstack(keep))
+
+
+class FRD_Data():
+    """Measured frequency response data (FRD)
+
+        The arrays may be memory-mapped. FRD_Data objects can be passed to the bode and
+        nichols figures and to metrics.margin like transfer functions: without an
+        explicit w, freqresp returns the display decimation of the data (see decimate),
+        otherwise the data interpolated on w.
+        """
+
+    def __init__(self, w, mag, phase, display_bins=DISPLAY_BINS):
+        w = np.asarray(w)
+        if len(w) > 1 and not np.all(w[1:] > w[:-1]):
+            order = np.argsort(w, kind="stable")
+            w, mag, phase = w[order], np.asarray(mag)[order], np.asarray(phase)[order]
+        self.w = w
+        self.mag = np.asarray(mag)
+        self.phase = np.asarray(phase)
+        self.dt = None
+        self.display_bins = display_bins
+        self.memo = {}
+
+    @classmethod
+    def from_array(cls, data, freq_unit="rad/s", mag_unit="abs", phase_unit="deg", **kwargs):
+        """ Build from an array (nb_rows x 3) of frequency, magnitude and phase """
+        data = np.asarray(data, dtype=float)
+        w = data[:, 0] * (2 * np.pi if freq_unit == "Hz" else 1)
+        mag = 10 ** (data[:, 1] / 20) if mag_unit == "dB" else data[:, 1]
+        phase = np.radians(data[:, 2]) if phase_unit == "deg" else data[:, 2]
+        return cls(w, mag, np.unwrap(phase), **kwargs)
+
+    @classmethod
+    def from_csv(cls, path, usecols=(0, 1, 2), delimiter=",", skiprows=0, freq_unit="rad/s", mag_unit="abs", phase_unit="deg",
+                 cache=True, chunk_size=CHUNK_SIZE, **kwargs):
+        """Read the frequency, magnitude and phase columns of a CSV file
+
+            With cache=True, the converted data (w in rad/s, mag in abs, unwrapped phase
+            in rad) is saved next to the file as "<path>.<key>.frd.npy" and memory-mapped
+            on the next reads, as long as the file is not modified. The key is a hash of
+            the parsing and unit arguments.
+            The units follow the from_array conventions.
+            """
+        options = (tuple(int(col) for col in usecols), delimiter, int(skiprows), freq_unit, mag_unit, phase_unit)
+        key = hashlib.sha1(repr(options).encode()).hexdigest()[:16]
+        cache_path = "{}.{}.frd.npy".format(path, key)
+        if cache and os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            data = np.load(cache_path, mmap_mode="r")
+            return cls(data[0], data[1], data[2], **kwargs)
+
+        frd = cls.from_array(parse_chunks(path, usecols, delimiter, skiprows, chunk_size), freq_unit, mag_unit, phase_unit, **kwargs)
+        if cache:
+            temp_path = "{}.{}.tmp.npy".format(cache_path, os.getpid())
+            np.save(temp_path, np.vstack((frd.w, frd.mag, frd.phase)))
+            os.replace(temp_path, cache_path)
+            data = np.load(cache_path, mmap_mode="r")
+            frd = cls(data[0], data[1], data[2], display_bins=frd.display_bins)
+        return frd
+
+    @classmethod
+    def from_binary(cls, path, dtype="<f8", nb_cols=3, usecols=(0, 1, 2), offset=0, **kwargs):
+        """ Memory-map a binary dump of rows of nb_cols values (the units are converted as in from_array) """
+        data = np.memmap(path, dtype=dtype, mode="r", offset=offset).reshape(-1, nb_cols)
+        return cls.from_array(data[:, list(usecols)], **kwargs)
+
+    @property
+    def isctime(self):
+        """ Measured responses are handled as continuous-time (see SystemAnalysis.isctime) """
+        return True
+
+    def memoize(self, key, compute):
+        if key not in self.memo:
+            self.memo[key] = compute()
+        return self.memo[key]
+
+    def freqresp(self, w=None):
+        """ Get the magnitude (abs), phase (rad) and frequencies (rad/s), decimated for display or interpolated on w """
+        if w is None:
+            def compute():
+                index = decimate(self.w, [self.mag, self.phase], self.display_bins)
+                return self.mag[index], self.phase[index], self.w[index]
+            return self.memoize("display", compute)
+        w = np.asarray(w, dtype=float)
+        log_w = np.log(self.w)
+        mag = np.exp(np.interp(np.log(w), log_w, np.log(self.mag)))
+        phase = np.interp(np.log(w), log_w, self.phase)
+        return mag, phase, w
+
+    @property
+    def margins(self):
+        """ Gain margin (abs), phase margin (deg), stability margin and their frequencies (rad/s), from all the data points """
+        def compute():
+            L = self.mag * np.exp(1j * self.phase)
+            distance = np.abs(1 + L)
+            index_s = np.argmin(distance)
+            margins = loop_margins(L, self.w)
+            return {"gm": 10 ** (margins["gm"][0] / 20), "pm": margins["pm"][0], "sm": distance[index_s],
+                    "wg": margins["wg"][0], "wp": margins["wp"][0], "ws": self.w[index_s]}
+        return self.memoize("margins", compute)
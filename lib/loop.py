@@ -0,0 +1,46 @@
+import numbers
+import numpy as np
+import control as ctl
+from .analysis import as_analysis
+
+LOOP_FUNCTIONS = ("S", "T", "KS", "PS")
+
+
+def loop_analysis(P, C, w=None):
+    """Gang of four of the loop L = C*P
+
+        P(jw) and C(jw) are evaluated once on the grid w, and the sensitivity
+        functions are derived from them with complex arithmetic (no feedback
+        transfer function is built).
+
+        S = 1/(1+L), T = L/(1+L), KS = C/(1+L), PS = P/(1+L)
+
+        Parameters
+        ----------
+        P : transfer function or SystemAnalysis (plant)
+        C : transfer function, SystemAnalysis or number (controller)
+        w : array-like, optional
+        Frequency grid (rad/s), by default the bode grid of P.
+        Returns
+        -------
+        dict with "w", the complex responses "L", "S", "T", "KS", "PS", the peaks
+        "Ms", "Mt" (abs) and their frequencies "ws", "wt" (rad/s)
+        """
+    plant = as_analysis(P)
+    if isinstance(C, numbers.Number):
+        C = ctl.tf(C, 1) if plant.isctime else ctl.tf(C, 1, plant.dt)
+    controller = as_analysis(C)
+    mag_p, phase_p, w = plant.freqresp(w)
+    mag_c, phase_c, _ = controller.freqresp(w)
+    w = np.asarray(w)
+
+    P_w = np.asarray(mag_p) * np.exp(1j * np.asarray(phase_p))
+    C_w = np.asarray(mag_c) * np.exp(1j * np.asarray(phase_c))
+    L = C_w * P_w
+    S = 1 / (1 + L)
+
+    result = {"w": w, "L": L, "S": S, "T": L * S, "KS": C_w * S, "PS": P_w * S}
+    index_s = np.argmax(np.abs(S))
+    index_t = np.argmax(np.abs(result["T"]))
+    result.update({"Ms": np.abs(S[index_s]), "ws": w[index_s], "Mt": np.abs(result["T"][index_t]), "wt": w[index_t]})
+    return result
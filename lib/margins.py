@@ -0,0 +1,59 @@
+import numpy as np
+
+
+def loop_margins(L, w):
+    """Get the margins of a batch of loop responses sampled on a grid
+
+        The crossovers are interpolated linearly in log|L|, phase (deg) and log(w)
+        between the grid points. When a loop has several crossovers, the margins the
+        closest to the stability limit are kept (smallest |pm| and |gm| in dB), as
+        ctl.stability_margins does.
+
+        Parameters
+        ----------
+        L : complex array (nb_loops x nb_w, or nb_w for a single loop)
+        w : array (nb_w)
+        Returns
+        -------
+        dict of arrays of size nb_loops: "pm" (deg), "gm" (dB), their frequencies "wp"
+        and "wg" (rad/s), the first gain crossover "wc" (rad/s) and the closed-loop
+        peak "mt" (dB)
+        """
+    L = np.atleast_2d(L)
+    rows = np.arange(len(L))
+    log_w = np.log(w)
+    log_mag = np.log(np.abs(L))
+    phase = np.degrees(np.unwrap(np.angle(L), axis=1))
+
+    def interpolate(x, t):
+        return x[..., :-1] + t * (x[..., 1:] - x[..., :-1])
+
+    def select(crossing, values, frequencies):
+        # crossover the closest to the stability limit
+        best = np.argmin(np.where(crossing, np.abs(values), np.inf), axis=1)
+        found = np.any(crossing, axis=1)
+        return np.where(found, values[rows, best], np.inf), np.where(found, frequencies[rows, best], np.nan)
+
+    # gain crossovers: log|L| changes sign
+    l0, l1 = log_mag[:, :-1], log_mag[:, 1:]
+    crossing = (l0 >= 0) & (l1 < 0) | (l0 < 0) & (l1 >= 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(crossing, l0 / (l0 - l1), 0)
+    pm_c = np.mod(interpolate(phase, t) + 180, 360)
+    pm_c = np.where(pm_c > 180, pm_c - 360, pm_c)
+    w_c = np.exp(interpolate(log_w, t))
+    pm, wp = select(crossing, pm_c, w_c)
+    wc = np.where(np.any(crossing, axis=1), w_c[rows, np.argmax(crossing, axis=1)], np.nan)
+
+    # phase crossovers: the phase crosses -180 (mod 360)
+    k0 = np.floor((phase[:, :-1] + 180) / 360)
+    k1 = np.floor((phase[:, 1:] + 180) / 360)
+    crossing = k0 != k1
+    target = 360 * np.maximum(k0, k1) - 180
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(crossing, (target - phase[:, :-1]) / (phase[:, 1:] - phase[:, :-1]), 0)
+    gm_c = -20 * interpolate(log_mag, t) / np.log(10)
+    gm, wg = select(crossing, gm_c, np.exp(interpolate(log_w, t)))
+
+    mt = 20 * np.log10(np.max(np.abs(L / (1 + L)), axis=1))
+    return {"pm": pm, "gm": gm, "wp": wp, "wg": wg, "wc": wc, "mt": mt}
@@ -1,43 +1,39 @@
 import control as ctl
 import numpy as np
 from .utils import get_T_max
-from scipy.signal.ltisys import _default_response_times
+from .analysis import as_analysis, vector_key
 
 def pole(sys):
-    return sys.pole()
+    return as_analysis(sys).poles
 
 def zero(sys):
-    return sys.zero()
+    return as_analysis(sys).zeros
+
+def margin(sys):
+    """ Get the gain margin (abs), phase margin (deg) and the phase and gain crossover frequencies (rad/s) of a transfer function or FRD data """
+    margins = as_analysis(sys).margins
+    return margins["gm"], margins["pm"], margins["wg"], margins["wp"]
 
 def damp(sys):
     
-    is_continuous = ctl.isctime(sys)
-    
-    for pole in sys.pole():
-        pole = pole.astype(complex) # WTF: the python control "damp" function is buggy due to this missing cast !
-
-        if is_continuous:
-            pole_continuous = pole
-        else:
-            pole_continuous = np.log(pole)/sys.dt
-        
-        wn = np.abs(pole_continuous)
-        m = -np.real(pole_continuous)/wn
-        print("poles {:.3f} : wn={:.3f} rad/s, m= {:.3f}".format(pole, wn, m))
+    # pole_info casts the poles to complex (the python control "damp" function is buggy due to this missing cast !)
+    for row in as_analysis(sys).modal:
+        print("poles {:.3f} : wn={:.3f} rad/s, m= {:.3f}".format(row["pole"], row["wn"], row["m"]))
 
 
 def stepinfo(sys, display=False, T=None, SettlingTimeThreshold=0.05,RiseTimeLimits=(0.1, 0.9)):
 
-    T_max = get_T_max([sys],T=None,N=200)
+    analysis = as_analysis(sys)
+    T_max = get_T_max([analysis],T=None,N=200)
 
     if T is None:
-        if ctl.isctime(sys):
+        if analysis.isctime:
             T = np.linspace(0,T_max,200)
         else:
             # For discrete time, use integers
-            T = np.arange(0,T_max,sys.dt)
+            T = np.arange(0,T_max,analysis.dt)
 
-    info = ctl.step_info(sys,T,SettlingTimeThreshold=0.05,RiseTimeLimits=(0.1, 0.9))
+    info = analysis.memoize(("stepinfo",vector_key(T)),lambda: ctl.step_info(analysis.tf,T,SettlingTimeThreshold=0.05,RiseTimeLimits=(0.1, 0.9)))
     
     if display == True :
         for keys,values in info.items():
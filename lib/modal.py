@@ -0,0 +1,44 @@
+import numpy as np
+import control as ctl
+from scipy import signal
+from scipy.special import factorial
+
+
+class Modal_Response():
+    """Continuous-time step or impulse response in modal form
+
+        y(t) = sum_i r_i t^(m_i-1)/(m_i-1)! exp(p_i t)
+
+        where (r_i, p_i) are the residues and poles of Y(s) = G(s)/s (step) or G(s) (impulse)
+        and m_i is the power of the term r_i/(s-p_i)^m_i. The response is evaluated exactly at
+        any time points, without integrating from t=0.
+        """
+
+    def __init__(self, tf, type="step", tol=1e-3):
+        if not ctl.isctime(tf):
+            raise ValueError("the modal response is only defined for continuous-time systems")
+        num = tf.num[0][0]
+        den = tf.den[0][0]
+        if type == "step":
+            den = np.polymul(den, [1, 0])
+
+        residues, poles, direct = signal.residue(num, den, tol=tol)
+        if type == "impulse" and np.any(np.asarray(direct) != 0):
+            raise ValueError("the impulse response of a non strictly proper system contains a Dirac")
+
+        # residue gives the same value to all the poles of a group (within tol), and
+        # lists the repeated poles consecutively, with powers 1, 2, ...
+        powers = np.ones(len(poles))
+        for index in range(1, len(poles)):
+            if poles[index] == poles[index - 1]:
+                powers[index] = powers[index - 1] + 1
+
+        self.type = type
+        self.residues = residues
+        self.poles = poles
+        self.powers = powers
+
+    def __call__(self, t):
+        t = np.asarray(t, dtype=float)
+        modes = np.exp(np.outer(t, self.poles)) * (t[:, None] ** (self.powers - 1) / factorial(self.powers - 1))
+        return np.real(modes @ self.residues)
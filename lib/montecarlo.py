@@ -0,0 +1,166 @@
+import os
+import numpy as np
+import control as ctl
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from .cache import bode_response
+from .utils import get_T_max
+from .shared import Shared_Arrays, attach
+
+OUTPUTS = ("mag", "phase", "step")
+
+
+class Envelope():
+    """Streaming reduction of response samples to min/max/mean/percentile envelopes
+
+        min, max and mean are exact. The percentiles are computed from a uniform
+        reservoir sample of at most reservoir_size responses (exact below this size),
+        so the memory does not grow with the number of samples.
+        """
+
+    def __init__(self, percentiles=(5, 50, 95), reservoir_size=2000, seed=None):
+        self.percentiles = percentiles
+        self.reservoir_size = reservoir_size
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.sum = None
+        self.reservoir = None
+
+    def update(self, samples):
+        """ Add a chunk of responses (nb_samples x nb_points) """
+        samples = np.atleast_2d(samples)
+        if self.count == 0:
+            self.min = np.min(samples, axis=0)
+            self.max = np.max(samples, axis=0)
+            self.sum = np.sum(samples, axis=0)
+            self.reservoir = np.empty((self.reservoir_size, samples.shape[1]), dtype=samples.dtype)
+        else:
+            self.min = np.minimum(self.min, np.min(samples, axis=0))
+            self.max = np.maximum(self.max, np.max(samples, axis=0))
+            self.sum += np.sum(samples, axis=0)
+
+        # reservoir sampling (algorithm R): sample i replaces a random slot with probability size/(i+1)
+        index = self.count + np.arange(len(samples))
+        slots = np.where(index < self.reservoir_size, index, self.rng.integers(0, index + 1))
+        keep = slots < self.reservoir_size
+        self.reservoir[slots[keep]] = samples[keep]
+        self.count += len(samples)
+
+    def result(self):
+        reservoir = self.reservoir[:min(self.count, self.reservoir_size)]
+        percentiles = {q: np.percentile(reservoir, q, axis=0) for q in self.percentiles}
+        return {"min": self.min, "max": self.max, "mean": self.sum / self.count, "percentiles": percentiles, "count": self.count}
+
+
+def sample_parameters(distribution, n_samples, rng):
+    """ Draw n_samples values of each parameter (scipy.stats frozen distributions or callables rng, size -> array) """
+    params = {}
+    for name, law in distribution.items():
+        if hasattr(law, "rvs"):
+            params[name] = law.rvs(size=n_samples, random_state=rng)
+        else:
+            params[name] = np.asarray(law(rng, n_samples))
+    return params
+
+
+def evaluate_chunk(plant_factory, params, w, T, out=None):
+    """ Compute the bode (dB, deg) and step responses of the plants of a chunk, in the out arrays (mag, phase, step) if given (the samples do not go to the response cache) """
+    n_samples = len(next(iter(params.values())))
+    if out is None:
+        out = (np.empty((n_samples, len(w))), np.empty((n_samples, len(w))), np.empty((n_samples, len(T))))
+    mag, phase, step = (array[:n_samples] for array in out)
+    for index in range(n_samples):
+        tf = plant_factory(**{name: values[index] for name, values in params.items()})
+        mag_list, phase_list, _ = ctl.bode_plot(tf, omega=w, Plot=False, omega_limits=None, omega_num=None, margins=None)
+        mag[index] = 20 * np.log10(mag_list)
+        phase[index] = np.degrees(phase_list)
+        step[index] = np.ravel(ctl.step_response(tf, T=T)[1])
+    return mag, phase, step
+
+
+def evaluate_chunk_shared(plant_factory, params, specs, slot):
+    """ Run evaluate_chunk in a worker: w, T and the output buffers are attached from shared memory, and the responses are written in the rows of slot """
+    with attach(specs) as arrays:
+        evaluate_chunk(plant_factory, params, arrays["w"], arrays["T"], tuple(arrays[key][slot] for key in OUTPUTS))
+    return slot
+
+
+def monte_carlo(plant_factory, distribution, n_samples=1000, w=None, T=None, chunk_size=100, percentiles=(5, 50, 95), reservoir_size=2000, n_jobs=None, seed=None):
+    """Monte Carlo frequency and step response envelopes
+
+        The plants are sampled and evaluated in chunks across a process pool, and each
+        chunk is reduced on the fly into Envelope objects (no sample is kept). w and T are
+        published once in shared memory, and the workers write the responses in shared
+        output slots (one per chunk in flight) instead of sending them back.
+
+        Parameters
+        ----------
+        plant_factory : callable
+        Function (defined at module level so that it can be sent to the workers)
+        returning a transfer function from keyword parameters.
+        distribution : dict
+        Parameter name -> scipy.stats frozen distribution or callable (rng, size) -> array.
+        n_samples : int
+        w : array-like, optional
+        Frequency grid (rad/s), by default the bode grid of the first sampled plant.
+        T : array-like, optional
+        Time vector (s), by default 200 points up to the settling of the first sampled plant.
+        n_jobs : int, optional
+        Number of worker processes (1 to evaluate in the current process).
+        Returns
+        -------
+        dict with "w", "mag" (dB), "phase" (deg), "t", "step" where the responses are
+        the Envelope results (dicts with "min", "max", "mean", "percentiles", "count")
+        """
+    rng = np.random.default_rng(seed)
+    first_plant = plant_factory(**{name: values[0] for name, values in sample_parameters(distribution, 1, rng).items()})
+    if w is None:
+        w = bode_response(first_plant)[2]
+    if T is None:
+        T = np.linspace(0, get_T_max([first_plant], N=200), 200)
+    w = np.asarray(w)
+    T = np.asarray(T)
+
+    envelopes = [Envelope(percentiles, reservoir_size, rng.integers(2 ** 32)) for _ in range(3)]
+
+    def reduce(results):
+        for envelope, samples in zip(envelopes, results):
+            envelope.update(samples)
+
+    chunks = [min(chunk_size, n_samples - start) for start in range(0, n_samples, chunk_size)]
+    if n_jobs == 1:
+        for size in chunks:
+            reduce(evaluate_chunk(plant_factory, sample_parameters(distribution, size, rng), w, T))
+    else:
+        max_pending = 2 * (n_jobs or os.cpu_count() or 1)
+        with Shared_Arrays() as shared:
+            shared.publish("w", w)
+            shared.publish("T", T)
+            for key, nb_points in zip(OUTPUTS, (len(w), len(w), len(T))):
+                shared.allocate(key, (max_pending, chunk_size, nb_points))
+
+            def collect(future):
+                slot = future.result()
+                size = sizes.pop(slot)
+                reduce(tuple(shared[key][slot, :size] for key in OUTPUTS))
+                free_slots.append(slot)
+
+            with ProcessPoolExecutor(n_jobs) as executor:
+                free_slots = list(range(max_pending))
+                sizes = {}
+                pending = set()
+                for size in chunks:
+                    if len(free_slots) == 0:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(future)
+                    slot = free_slots.pop()
+                    sizes[slot] = size
+                    params = sample_parameters(distribution, size, rng)
+                    pending.add(executor.submit(evaluate_chunk_shared, plant_factory, params, shared.specs, slot))
+                for future in pending:
+                    collect(future)
+
+    mag, phase, step = [envelope.result() for envelope in envelopes]
+    return {"w": w, "mag": mag, "phase": phase, "t": T, "step": step}
@@ -0,0 +1,132 @@
+import numbers
+import numpy as np
+import scipy.linalg
+import control as ctl
+from .analysis import as_analysis
+
+STABILITY_TOL = 1e-8  # modes closer to the stability boundary are kept with the unstable part
+
+
+def state_space(sys):
+    """ Get the (A, B, C, D, dt) matrices of a state space system, a transfer function or a SystemAnalysis (dt is None in continuous time, see SystemAnalysis.isctime) """
+    if not isinstance(sys, ctl.StateSpace):
+        sys = as_analysis(sys).ss
+    A, B, C, D = (np.asarray(M, dtype=float) for M in (sys.A, sys.B, sys.C, sys.D))
+    return A, B, C, D, None if ctl.isctime(sys) else sys.dt
+
+
+def gramian_factor(W):
+    """ Get L such that W = L L^T (W symmetric positive semi-definite) """
+    s, U = np.linalg.eigh((W + W.T) / 2)
+    return U * np.sqrt(np.maximum(s, 0))
+
+
+def stable_split(A, B, C, dt=None):
+    """Split a system into its stable and unstable (or marginally stable) parts
+
+        The real Schur form of A is ordered with the strictly stable eigenvalues first
+        (Re < -STABILITY_TOL, or |z|^2 < 1-STABILITY_TOL in discrete time), so that the
+        integrators and the other modes on the stability boundary go to the unstable
+        part, and the coupling block is removed by solving a Sylvester equation.
+
+        Returns
+        -------
+        (A1, B1, C1) stable part, (A2, B2, C2) unstable part
+        """
+    if dt is None:
+        sort = lambda re, im: re < -STABILITY_TOL
+    else:
+        sort = lambda re, im: re * re + im * im < 1 - STABILITY_TOL
+    T, Q, k = scipy.linalg.schur(A, output="real", sort=sort)
+    B = Q.T @ B
+    C = C @ Q
+    T11, T12, T22 = T[:k, :k], T[:k, k:], T[k:, k:]
+    if 0 < k < A.shape[0]:
+        X = scipy.linalg.solve_sylvester(T11, -T22, -T12)
+    else:
+        X = np.zeros((k, A.shape[0] - k))
+    B1 = B[:k] - X @ B[k:]
+    C2 = C[:, k:] + C[:, :k] @ X
+    return (T11, B1, C[:, :k]), (T22, B[k:], C2)
+
+
+def hankel_singular_values(sys):
+    """ Get the Hankel singular values of the stable part of a system (decreasing order) """
+    A, B, C, D, dt = state_space(sys)
+    (A1, B1, C1), _ = stable_split(A, B, C, dt)
+    return balance_factors(A1, B1, C1, dt)[0]
+
+
+def balance_factors(A, B, C, dt=None):
+    """ Get the Hankel singular values and the square-root balancing factors of a stable system """
+    if dt is None:
+        Wc = scipy.linalg.solve_continuous_lyapunov(A, -B @ B.T)
+        Wo = scipy.linalg.solve_continuous_lyapunov(A.T, -C.T @ C)
+    else:
+        Wc = scipy.linalg.solve_discrete_lyapunov(A, B @ B.T)
+        Wo = scipy.linalg.solve_discrete_lyapunov(A.T, C.T @ C)
+    Lc = gramian_factor(Wc)
+    Lo = gramian_factor(Wo)
+    U, hsv, Vt = np.linalg.svd(Lo.T @ Lc)
+    return hsv, Lc, Lo, U, Vt.T
+
+
+def balanced_truncation(sys, order=None, tol=None):
+    """Reduced model by balanced truncation
+
+        The unstable (and marginally stable) modes are kept, the stable part is balanced
+        and truncated. The H-infinity norm of the error is bounded by twice the sum of
+        the discarded Hankel singular values.
+
+        Parameters
+        ----------
+        sys : transfer function, state space or SystemAnalysis
+        order : int, optional
+        Order of the reduced model (including the unstable modes).
+        tol : float, optional
+        Maximal error bound, the smallest order satisfying it is chosen.
+        Returns
+        -------
+        dict with the reduced transfer function "sys", its "order", the Hankel singular
+        values "hsv" of the stable part and the "error_bound"
+        """
+    if (order is None) == (tol is None):
+        raise ValueError("exactly one of order or tol is required")
+    A, B, C, D, dt = state_space(sys)
+    (A1, B1, C1), (A2, B2, C2) = stable_split(A, B, C, dt)
+    n_unstable = A2.shape[0]
+
+    hsv, Lc, Lo, U, V = balance_factors(A1, B1, C1, dt)
+    # error bound when keeping the r first states: 2*sum(hsv[r:])
+    bounds = 2 * np.append(np.cumsum(hsv[::-1])[::-1], 0)
+    if order is not None:
+        r = int(np.clip(order - n_unstable, 0, len(hsv)))
+    else:
+        r = int(np.argmax(bounds <= tol))
+    # states with a zero Hankel singular value are uncontrollable or unobservable
+    r = min(r, int(np.sum(hsv > hsv[0] * 1e-14)) if len(hsv) else 0)
+
+    scale = 1 / np.sqrt(hsv[:r])
+    T = Lc @ V[:, :r] * scale
+    T_inv = (U[:, :r] * scale).T @ Lo.T
+    Ar = scipy.linalg.block_diag(T_inv @ A1 @ T, A2)
+    Br = np.vstack((T_inv @ B1, B2))
+    Cr = np.hstack((C1 @ T, C2))
+
+    if Ar.shape[0] == 0:
+        reduced = ctl.tf(D[0, 0], 1, dt)
+        return {"sys": reduced, "order": 0, "hsv": hsv, "error_bound": bounds[r]}
+    if dt is None:
+        reduced = ctl.ss(Ar, Br, Cr, D)
+    else:
+        reduced = ctl.ss(Ar, Br, Cr, D, dt)
+    return {"sys": ctl.ss2tf(reduced), "order": r + n_unstable, "hsv": hsv, "error_bound": bounds[r]}
+
+
+def approximation(approx):
+    """ Get the balanced_truncation arguments of a figure approx option (int: order, float: tolerance) """
+    if isinstance(approx, numbers.Integral):
+        return {"order": int(approx)}
+    if isinstance(approx, numbers.Real):
+        return {"tol": float(approx)}
+    raise ValueError("approx must be an int (order) or a float (error bound), got {!r}".format(approx))
@@ -0,0 +1,123 @@
+import numpy as np
+from scipy.spatial import cKDTree
+from scipy.optimize import brentq
+from .analysis import as_analysis
+from .core import pole_info
+
+
+class Rlocus_Index():
+    """Spatial index over the root-locus points of feedback(K*tf,1)
+
+        The branch points computed for k_vect are stored in a KD-tree, so that a point of
+        the complex plane, or a target damping m / natural frequency wn, is mapped to the
+        nearest computed gain without recomputing the locus. The gain is then refined
+        analytically (K = |den(s)/num(s)| on the locus).
+
+        The roots (nb_gains x nb_branches) already computed by Rlocus_Figure.plot can be
+        given, so that the branches of the index are the p1..pn traces of the figure.
+        """
+
+    def __init__(self, tf, k_vect=np.logspace(-2, 1.2, 1000), roots=None):
+        self.analysis = as_analysis(tf)
+        self.dt = self.analysis.Te
+        self.num = np.atleast_1d(np.squeeze(self.analysis.num[0][0]))
+        self.den = np.atleast_1d(np.squeeze(self.analysis.den[0][0]))
+
+        if roots is None:
+            roots = self.analysis.feedback_poles(k_vect)
+        self.roots = np.asarray(roots, dtype=complex)    # nb_gains x nb_branches
+        self.gains = np.asarray(k_vect, dtype=float)
+        points = np.ravel(self.roots)
+        self.tree = cKDTree(np.column_stack((points.real, points.imag)))
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.wn, self.m = pole_info(self.roots, dt=self.dt)
+
+    def closed_loop_poles(self, K):
+        return np.roots(np.polyadd(self.den, K * self.num))
+
+    def get_result(self, K, s, branch):
+        """ Get the closed-loop poles for the gain K and the pole the nearest to s """
+        poles = self.closed_loop_poles(K)
+        pole = poles[np.argmin(np.abs(poles - s))]
+        wn, m = pole_info(pole, dt=self.dt)
+        return {"K": K, "pole": pole, "poles": poles, "wn": wn, "m": m, "branch": branch}
+
+    def gain_at(self, s):
+        """Get the gain whose closed-loop poles are the nearest to the point s
+
+            The nearest branch point is found with the KD-tree, s is projected on the
+            adjacent locus segments and the gain is evaluated at the projection with
+            K = |den(s)/num(s)|.
+
+            Returns
+            -------
+            dict with "K", "pole" (closed-loop pole the nearest to s), "poles" (all the
+            closed-loop poles), "wn", "m", "branch" and "distance" (from s to pole)
+            """
+        s = complex(s)
+        _, flat_index = self.tree.query([s.real, s.imag])
+        index, branch = np.unravel_index(flat_index, self.roots.shape)
+
+        projection = self.roots[index, branch]
+        for neighbour in (index - 1, index + 1):
+            if 0 <= neighbour < len(self.gains):
+                a, b = self.roots[index, branch], self.roots[neighbour, branch]
+                if a == b:
+                    continue
+                t = np.clip(np.real((s - a) * np.conj(b - a)) / np.abs(b - a) ** 2, 0, 1)
+                candidate = a + t * (b - a)
+                if np.abs(s - candidate) < np.abs(s - projection):
+                    projection = candidate
+
+        num_value = np.polyval(self.num, projection)
+        if num_value == 0:
+            K = 0.
+        else:
+            K = np.abs(np.polyval(self.den, projection) / num_value)
+        result = self.get_result(K, projection, branch)
+        result["distance"] = np.abs(result["pole"] - s)
+        return result
+
+    def gain_for(self, m=None, wn=None):
+        """Get the gains for which a closed-loop pole has the damping m or the natural frequency wn (rad/s)
+
+            The crossings are located on the indexed branches and each gain is refined
+            with brentq between the two bracketing computed gains.
+
+            Returns
+            -------
+            list of dicts (see gain_at) sorted by increasing gain
+            """
+        if (m is None) == (wn is None):
+            raise ValueError("exactly one of m or wn is required")
+        values, target = (self.m, m) if m is not None else (self.wn, wn)
+        criterion = 1 if m is not None else 0
+
+        d = values - target
+        crossing = np.isfinite(d[:-1]) & np.isfinite(d[1:]) & (np.sign(d[:-1]) != np.sign(d[1:]))
+        # complex conjugate branches give the same gains
+        crossing &= np.imag(self.roots[:-1]) >= 0
+
+        results = []
+        for index, branch in zip(*np.nonzero(crossing)):
+            k0, k1 = self.gains[index], self.gains[index + 1]
+            s0, s1 = self.roots[index, branch], self.roots[index + 1, branch]
+
+            def tracked_pole(K):
+                s = s0 + (K - k0) / (k1 - k0) * (s1 - s0)
+                poles = self.closed_loop_poles(K)
+                return poles[np.argmin(np.abs(poles - s))], s
+
+            def error(K):
+                pole, _ = tracked_pole(K)
+                return pole_info(pole, dt=self.dt)[criterion] - target
+
+            try:
+                K = brentq(error, k0, k1)
+            except ValueError:
+                # the tracked root jumped between two branches inside the bracket
+                continue
+            results.append(self.get_result(K, tracked_pole(K)[1], branch))
+
+        return sorted(results, key=lambda result: result["K"])
@@ -0,0 +1,190 @@
+import asyncio
+import argparse
+import hashlib
+import json
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from control import tf
+from .figures import figure
+
+# Local HTTP figure service
+#
+# POST /figure with a json body:
+# {"type": "bode", "num": [1], "den": [1, 2, 1], "dt": null, "label": "sys",
+#  "options": {"w": [...]}, "grid": {}, "render_mode": "svg", "xlim": null, "ylim": null}
+# Several systems can be plotted on the same figure with "systems": [{"num", "den", "dt", "label", "options"}, ...]
+# The response is the Figure.json() string.
+
+FIGURE_TYPES = ("time", "pzmap", "bode", "nichols", "rlocus")  # figures built from one transfer function per system
+HTTP_STATUS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 500: "Internal Server Error"}
+
+
+def request_key(request):
+    """ Get the content hash of a figure request """
+    text = json.dumps(request, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def render_figure(request):
+    """ Build the figure described by a request and return its json (run in the worker pool) """
+    fig = figure(request.get("type", "bode"), render_mode=request.get("render_mode", "svg"))
+
+    systems = request.get("systems", [request])
+    for system in systems:
+        sys = tf(system["num"], system["den"], system.get("dt"))
+        options = {}
+        for key, value in system.get("options", {}).items():
+            options[key] = np.asarray(value) if isinstance(value, list) else value
+        fig.plot(sys, label=system.get("label", "sys"), **options)
+
+    if request.get("grid") is not None:
+        fig.grid(**request["grid"])
+    if request.get("xlim") is not None:
+        fig.xlim(request["xlim"])
+    if request.get("ylim") is not None:
+        fig.ylim(request["ylim"])
+    return fig.json()
+
+
+class Figure_Server():
+
+    def __init__(self, host="127.0.0.1", port=8050, workers=None, cache_size=256, executor=None):
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.executor = executor
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.pending = {}
+        self.stats = {"requests": 0, "computed": 0, "coalesced": 0, "cache_hits": 0}
+        self.server = None
+
+    async def start(self):
+        if self.executor is None:
+            # spawned workers do not inherit the sockets of the open connections
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self.server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    def get_cache(self, key):
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache.move_to_end(key)
+        return result
+
+    def set_cache(self, key, result):
+        self.cache[key] = result
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+
+    async def get_figure(self, request):
+        """ Get the figure json, from the cache, from an identical request in flight, or from the worker pool """
+        self.stats["requests"] += 1
+        key = request_key(request)
+
+        result = self.get_cache(key)
+        if result is not None:
+            self.stats["cache_hits"] += 1
+            return result
+
+        if key in self.pending:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(self.pending[key])
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, render_figure, request)
+        self.pending[key] = future
+        self.stats["computed"] += 1
+        try:
+            result = await asyncio.shield(future)
+            self.set_cache(key, result)
+        finally:
+            del self.pending[key]
+        return result
+
+    async def handle(self, reader, writer):
+        try:
+            status, body = await self.handle_request(reader)
+        except Exception as error:
+            status, body = 500, json.dumps({"error": str(error)})
+
+        header = "HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: close\r\n\r\n"
+        body = body.encode()
+        writer.write(header.format(status, HTTP_STATUS[status], len(body)).encode() + body)
+        await writer.drain()
+        writer.close()
+
+    async def handle_request(self, reader):
+        request_line = (await reader.readline()).decode().split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode().strip()
+            if line == "":
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if len(request_line) < 2:
+            return 400, json.dumps({"error": "malformed request"})
+        method, path = request_line[0], request_line[1]
+        if path == "/stats":
+            return 200, json.dumps(self.stats)
+        if path != "/figure":
+            return 404, json.dumps({"error": "unknown path {}".format(path)})
+        if method != "POST":
+            return 405, json.dumps({"error": "use POST"})
+
+        body = await reader.readexactly(int(headers.get("content-length", 0)))
+        try:
+            request = json.loads(body.decode())
+        except ValueError as error:
+            return 400, json.dumps({"error": "invalid json: {}".format(error)})
+        if not isinstance(request, dict):
+            return 400, json.dumps({"error": "the figure request must be a json object"})
+        if request.get("type", "bode") not in FIGURE_TYPES:
+            return 400, json.dumps({"error": "unknown figure type {!r}, expected one of {}".format(request.get("type"), ", ".join(FIGURE_TYPES))})
+        try:
+            return 200, await self.get_figure(request)
+        except (KeyError, TypeError, ValueError) as error:
+            return 400, json.dumps({"error": "invalid figure request: {!r}".format(error)})
+
+
+async def serve(host="127.0.0.1", port=8050, workers=None, cache_size=256):
+    server = Figure_Server(host, port, workers, cache_size)
+    await server.start()
+    print("Serving figures on http://{}:{}/figure".format(server.host, server.port))
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local figure service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8050)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--cache-size", type=int, default=256)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.workers, args.cache_size))
+
+
+if __name__ == "__main__":
+    main()
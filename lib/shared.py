@@ -0,0 +1,103 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+
+class Shared_Array():
+    """ Picklable reference to an array in shared memory (sent to the workers instead of the data) """
+    __slots__ = ("name", "shape", "dtype")
+
+    def __init__(self, name, shape, dtype):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+
+
+class Shared_Arrays():
+    """Arrays published in shared memory by the main process
+
+        Input arrays (coefficients, w or T vectors) are copied once with publish, and
+        output buffers are preallocated with allocate. The workers receive the small
+        Shared_Array references of specs and attach to the arrays without copy (see
+        attach). Use as a context manager: the blocks are released on exit, so the
+        results must be copied (or reduced) before.
+        """
+
+    def __init__(self):
+        self.blocks = {}
+        self.arrays = {}
+        self.specs = {}
+
+    def allocate(self, key, shape, dtype=float):
+        """ Get a zero-initialized shared array """
+        dtype = np.dtype(dtype)
+        shape = tuple(int(size) for size in np.atleast_1d(shape))
+        block = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)) * dtype.itemsize, 1))
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array[...] = 0
+        self.blocks[key] = block
+        self.arrays[key] = array
+        self.specs[key] = Shared_Array(block.name, shape, dtype.str)
+        return array
+
+    def publish(self, key, array):
+        """ Copy an array to shared memory """
+        array = np.asarray(array)
+        shared = self.allocate(key, array.shape, array.dtype)
+        shared[...] = array
+        return shared
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def close(self):
+        self.arrays.clear()
+        for block in self.blocks.values():
+            release(block)
+            block.unlink()
+        self.blocks.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Attached_Arrays():
+    """ Zero-copy views of published arrays in a worker process (see attach) """
+
+    def __init__(self, specs):
+        self.blocks = []
+        self.arrays = {}
+        for key, spec in specs.items():
+            block = shared_memory.SharedMemory(name=spec.name)
+            self.blocks.append(block)
+            self.arrays[key] = np.ndarray(spec.shape, dtype=spec.dtype, buffer=block.buf)
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def close(self):
+        self.arrays.clear()
+        for block in self.blocks:
+            release(block)
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def attach(specs):
+    """ Attach the arrays of Shared_Arrays.specs in a worker, use as a context manager """
+    return Attached_Arrays(specs)
+
+
+def release(block):
+    """ Close a shared memory block (if views of it are still alive, it is unmapped when they are garbage collected) """
+    try:
+        block.close()
+    except BufferError:
+        pass
@@ -0,0 +1,65 @@
+import json
+import numpy as np
+import plotly
+from .utils import value_digest
+
+ARRAY_KEYS = ("x", "y", "z", "text", "customdata")
+
+class Array_Store():
+    """ Store of the trace arrays and styles of a figure: equal arrays (and styles) are stored once and shared by reference """
+
+    def __init__(self, dtype=None):
+        self.dtype = dtype
+        self.arrays = {}
+        self.styles = {}
+
+    def add(self, value):
+        if value is None:
+            return None
+        array = np.asarray(value)
+        if self.dtype is not None and array.dtype.kind == "f":
+            array = array.astype(self.dtype)
+        return self.arrays.setdefault(value_digest(array), array)
+
+    def intern_style(self, style):
+        """ Get the shared instance of a style dict (line, hovertemplate, mode, ...), released with the store """
+        key = json.dumps(style, sort_keys=True, cls=plotly.utils.PlotlyJSONEncoder)
+        return self.styles.setdefault(key, style)
+
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+
+class Trace():
+    __slots__ = ("x", "y", "z", "text", "customdata", "name", "style")
+
+    def __init__(self, x=None, y=None, z=None, text=None, customdata=None, name=None, style=None):
+        self.x = x
+        self.y = y
+        self.z = z
+        self.text = text
+        self.customdata = customdata
+        self.name = name
+        self.style = style if style is not None else {}
+
+    @classmethod
+    def from_dict(cls, data, store=None):
+        """ Build a trace from a plotly dict, arrays go to the store and the other attributes to a style interned in the store """
+        if store is None:
+            store = Array_Store()
+        style = {key: value for key, value in data.items() if key not in ARRAY_KEYS and key != "name"}
+        arrays = [store.add(data.get(key)) for key in ARRAY_KEYS]
+        return cls(*arrays, name=data.get("name"), style=store.intern_style(style))
+
+    def to_dict(self):
+        data = dict(self.style)
+        for key in ARRAY_KEYS + ("name",):
+            value = getattr(self, key)
+            if value is not None:
+                data[key] = value
+        return data
+
+    def __getitem__(self, key):
+        if key in ARRAY_KEYS or key == "name":
+            return getattr(self, key)
+        return self.style[key]
@@ -0,0 +1,168 @@
+import numpy as np
+import control as ctl
+from .analysis import as_analysis, SystemAnalysis
+from .controllers import pi, dpi
+from .margins import loop_margins
+
+PM_CANDIDATES = np.arange(20, 85, 5)  # deg, phase margins explored when pm is not specified
+MAX_CROSSOVER_CANDIDATES = 200
+DEFAULT_NB_W = 500
+MARGIN_TOL = 1e-3
+
+
+def default_grid(analysis, nb_w=DEFAULT_NB_W):
+    """ Get nb_w points over the default bode range (up to the Nyquist frequency in discrete time), without evaluating the response """
+    if not isinstance(analysis, SystemAnalysis):
+        w_min, w_max = analysis.w[0], analysis.w[-1]
+    else:
+        omega = ctl.freqplot.default_frequency_range(analysis.tf)
+        w_min, w_max = omega[0], omega[-1]
+        if not analysis.isctime:
+            w_max = min(w_max, np.pi / analysis.dt)
+    return np.logspace(np.log10(w_min), np.log10(w_max), nb_w)
+
+
+def integral_factor(w, Te=None):
+    """ Get q(jw) such that the PI controller is C = K*(1+q/Ti) """
+    if Te is None:
+        return 1 / (1j * w)
+    z = np.exp(1j * w * Te)
+    return Te * z / (z - 1)
+
+
+def proportional_gains(P, pm=None, gm=None):
+    """ Get the gains K for which K*P has exactly the phase margin pm (deg) or the gain margin gm (dB) on the grid """
+    log_mag = np.log(np.abs(P))
+    phase = np.degrees(np.unwrap(np.angle(P)))
+    gains = []
+    targets = []
+    if pm is not None:
+        targets.append((-180 + pm, 0))
+    if gm is not None:
+        targets.append((-180, gm))
+    for offset, margin in targets:
+        # segments where the phase crosses offset (mod 360)
+        k0 = np.floor((phase[:-1] - offset) / 360)
+        k1 = np.floor((phase[1:] - offset) / 360)
+        index = np.nonzero(k0 != k1)[0]
+        crossing_phase = 360 * np.maximum(k0, k1)[index] + offset
+        t = (crossing_phase - phase[index]) / (phase[index + 1] - phase[index])
+        log_mag_c = log_mag[index] + t * (log_mag[index + 1] - log_mag[index])
+        gains.append(np.exp(-log_mag_c) * 10 ** (-margin / 20))
+    return np.hstack(gains + [[]])
+
+
+def tune(sys, controller="PI", pm=None, gm=None, wc=None, mt=None, w=None):
+    """Margin-constrained P / PI autotuning
+
+        The plant frequency response is evaluated once on the grid w. For each candidate
+        crossover frequency (and phase margin for the PI), the controller parameters are
+        obtained analytically from |L(jwc)|=1 and arg L(jwc)=-180+pm, and the margins
+        of all the candidate loops are checked at once. The candidate with the largest
+        gain K (P) or integral gain K/Ti (PI) satisfying the specifications is returned.
+        For a discrete plant, the PI is the discrete PI of controllers.dpi with Te=sys.dt.
+        For measured data (FRD_Data), the closed-loop poles are unknown and the stability
+        relies on the margins only.
+
+        Parameters
+        ----------
+        sys : transfer function, SystemAnalysis or FRD_Data
+        controller : "P" or "PI"
+        pm : float, optional
+        Minimal phase margin (deg).
+        gm : float, optional
+        Minimal gain margin (dB).
+        wc : float, optional
+        Gain crossover frequency (rad/s).
+        mt : float, optional
+        Maximal closed-loop peak (dB), i.e. M-contour of the Nichols chart not to cross.
+        w : array-like, optional
+        Frequency grid (rad/s), by default DEFAULT_NB_W points over the default bode range.
+        Returns
+        -------
+        dict with the controller parameters ("K", "Ti", "Te"), the controller "C" and the obtained "pm", "gm", "wc", "mt"
+        """
+    if controller not in ("P", "PI"):
+        raise ValueError("controller must be 'P' or 'PI', got {!r}".format(controller))
+    if pm is None and gm is None and wc is None and mt is None:
+        raise ValueError("at least one specification (pm, gm, wc or mt) is required")
+
+    analysis = as_analysis(sys)
+    # continuous-time plants may have dt=None or dt=0 (see SystemAnalysis.isctime)
+    discrete = not analysis.isctime
+    Te = analysis.dt if discrete else None
+    if w is None:
+        w = default_grid(analysis)
+    if wc is not None:
+        w = np.unique(np.append(w, wc))
+    mag, phase, w = analysis.freqresp(w)
+    w = np.asarray(w)
+    P = np.asarray(mag) * np.exp(1j * np.asarray(phase))
+
+    # candidate crossover frequencies
+    if wc is not None:
+        index_c = np.array([np.argmin(np.abs(w - wc))])
+    else:
+        index_c = np.unique(np.linspace(0, len(w) - 1, min(len(w), MAX_CROSSOVER_CANDIDATES)).astype(int))
+    P_c = P[index_c]
+
+    if controller == "P":
+        K = 1 / np.abs(P_c)
+        if wc is None:
+            K = np.hstack([K, proportional_gains(P, pm, gm)])
+        Ti = np.full(len(K), np.inf)
+        C1 = np.ones((len(K), 1))
+        objective = K
+    else:
+        pm_list = PM_CANDIDATES if pm is None else np.array([pm])
+        pm_grid, index_grid = np.meshgrid(pm_list, np.arange(len(index_c)))
+        pm_grid, index_grid = np.ravel(pm_grid), np.ravel(index_grid)
+        q_c = integral_factor(w[index_c][index_grid], Te)
+
+        # arg(1+q/Ti) = phi  =>  Ti = Im(q)/tan(phi) - Re(q)
+        phi = np.radians(np.mod(-180 + pm_grid - np.degrees(np.angle(P_c[index_grid])) + 180, 360) - 180)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            Ti = np.imag(q_c) / np.tan(phi) - np.real(q_c)
+        valid = (Ti > 0) & (phi < 0) & np.isclose(np.angle(1 + q_c / Ti), phi, atol=1e-6)
+        Ti, q_c, index_grid = Ti[valid], q_c[valid], index_grid[valid]
+
+        K = 1 / np.abs(P_c[index_grid] * (1 + q_c / Ti))
+        C1 = 1 + integral_factor(w, Te)[None, :] / Ti[:, None]
+        objective = K / Ti
+
+    L = K[:, None] * C1 * P[None, :]
+    margins = loop_margins(L, w)
+    pm_L, gm_L, wc_L, mt_L = margins["pm"], margins["gm"], margins["wc"], margins["mt"]
+
+    feasible = np.isfinite(wc_L)
+    if pm is not None:
+        feasible &= pm_L >= pm - MARGIN_TOL
+    else:
+        feasible &= pm_L > 0
+    if gm is not None:
+        feasible &= gm_L >= gm - MARGIN_TOL
+    else:
+        feasible &= gm_L > 0
+    if mt is not None:
+        feasible &= mt_L <= mt + MARGIN_TOL
+
+    # best feasible candidate with a stable closed loop
+    for index in np.argsort(-np.where(feasible, objective, -np.inf)):
+        if not feasible[index]:
+            break
+        if controller == "P":
+            C = ctl.tf([K[index]], [1], Te)
+        elif not discrete:
+            C = pi(K[index], Ti[index])
+        else:
+            C = dpi(K[index], Ti[index], Te)
+
+        if not isinstance(analysis, SystemAnalysis):
+            stable = True
+        else:
+            poles = ctl.feedback(C * analysis.tf, 1).pole()
+            stable = np.all(np.abs(poles) < 1) if discrete else np.all(np.real(poles) < 0)
+        if stable:
+            return {"K": K[index], "Ti": Ti[index], "Te": Te, "C": C, "pm": pm_L[index], "gm": gm_L[index], "wc": wc_L[index], "mt": mt_L[index]}
+
+    raise ValueError("no {} controller satisfies the specifications on this frequency grid".format(controller))
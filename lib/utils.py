@@ -1,7 +1,16 @@
 import numpy as np
 import scipy as sp
+import hashlib
+import json
+import plotly
 from scipy.signal.ltisys import _default_response_times
-import control as ctl
+from .analysis import as_analysis
+
+WEBGL_THRESHOLD = 10000
+RENDER_MODES = ["svg", "webgl", "auto"]
+DENSITY_BINS = 100
+DENSITY_STYLES = ["heatmap", "contour"]
+GRID_POINTS = 2000
 
 
 def get_T_max(tf_list,T=None,N=100):
@@ -9,13 +18,13 @@ def get_T_max(tf_list,T=None,N=100):
     if T is None:
         T_max = 100000
         for tf in tf_list:
+            analysis = as_analysis(tf)
             
-            if ctl.isctime(tf):
-                ss = ctl.tf2ss(tf)
-                T_temp = _default_response_times(ss.A, N)
+            if analysis.isctime:
+                T_temp = _default_response_times(analysis.ss.A, N)
                 t_max_temp = T_temp[-1]
             else:
-                t_max_temp = N*tf.dt
+                t_max_temp = N*analysis.dt
 
             if t_max_temp < T_max :
                 T_max = t_max_temp
@@ -24,20 +33,175 @@ def get_T_max(tf_list,T=None,N=100):
     return T_max
 
 
-def nichols_grid(cl_mags=None, cl_phases=None):
-    """Nichols chart grid
+def count_points(data):
+    """ Get the total number of points of a list of traces """
+    nb_points = 0
+    for trace in data:
+        if "x" in trace:
+            nb_points += len(trace["x"])
+    return nb_points
+
+
+def check_render_mode(render_mode):
+    if render_mode not in RENDER_MODES:
+        raise ValueError("render_mode must be one of {}, got {!r}".format(RENDER_MODES, render_mode))
+    return render_mode
+
+
+def apply_render_mode(data, render_mode="svg", threshold=WEBGL_THRESHOLD):
+    """Set the plotly trace type of a list of scatter traces
+
         Parameters
         ----------
-        cl_mags : array-like (dB), optional
-        Array of closed-loop magnitudes defining the iso-gain lines on a
-        custom Nichols chart.
-        cl_phases : array-like (degrees), optional
-        Array of closed-loop phases defining the iso-phase lines on a custom
-        Nichols chart. Must be in the range -360 < cl_phases < 0
+        data : list of dict
+        Plotly traces. Only scatter traces are modified (heatmaps, ... are left unchanged).
+        render_mode : "svg", "webgl" or "auto"
+        With "auto", the traces are rendered with "scattergl" when the total
+        number of points exceeds threshold.
+        threshold : int
         Returns
         -------
-        None
+        list of dict
+        """
+    check_render_mode(render_mode)
+    use_webgl = render_mode == "webgl" or (render_mode == "auto" and count_points(data) > threshold)
+    trace_type = "scattergl" if use_webgl else "scatter"
+
+    data_new = []
+    for trace in data:
+        if trace.get("type", "scatter") in ("scatter", "scattergl"):
+            trace = dict(trace, type=trace_type)
+        data_new.append(trace)
+    return data_new
+
+
+def value_digest(value):
+    """ Get a digest of a trace attribute (array attributes are hashed from their raw bytes) """
+    if isinstance(value, (np.ndarray, list, tuple)):
+        array = np.asarray(value)
+        if array.dtype != object:
+            array = np.ascontiguousarray(array)
+            header = "{}{}".format(array.dtype.str, array.shape).encode()
+            return hashlib.sha1(header + array.tobytes()).hexdigest()
+    text = json.dumps(value, sort_keys=True, cls=plotly.utils.PlotlyJSONEncoder)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def trace_fingerprint(trace):
+    """ Get the fingerprint of a trace as a dict key -> (digest, length) """
+    fingerprint = {}
+    for key, value in trace.items():
+        if isinstance(value, (np.ndarray, list, tuple)):
+            length = len(value)
+        else:
+            length = None
+        fingerprint[key] = (value_digest(value), length)
+    return fingerprint
+
+
+def trace_patch(trace, fingerprint):
+    """Compare a trace to the fingerprint of its last exported version
+
+        Returns
+        -------
+        (kind, update) where kind is None (unchanged), "extend" (array
+        attributes only received new points, update contains the new points)
+        or "restyle" (update contains the new values of the modified attributes).
         """
+    extend = {}
+    restyle = {}
+    for key, value in trace.items():
+        digest, length = fingerprint.get(key, (None, None))
+        if key in fingerprint and value_digest(value) == digest:
+            continue
+        restyle[key] = value
+        if length is not None and isinstance(value, (np.ndarray, list, tuple)) and len(value) > length:
+            if value_digest(np.asarray(value)[:length]) == digest:
+                extend[key] = np.asarray(value)[length:]
+    for key in fingerprint:
+        if key not in trace:
+            restyle[key] = None
+
+    if len(restyle) == 0:
+        return None, {}
+    if len(extend) == len(restyle):
+        return "extend", extend
+    return "restyle", restyle
+
+
+def check_density_style(style):
+    if style not in DENSITY_STYLES:
+        raise ValueError("density must be one of {}, got {!r}".format(DENSITY_STYLES, style))
+    return style
+
+
+def pz_density(poles, zeros, bins=DENSITY_BINS, extent=None):
+    """Bin the poles and zeros of a batch of systems into 2-D histograms
+
+        Parameters
+        ----------
+        poles, zeros : complex array-like
+        Concatenated poles and zeros of all the systems.
+        bins : int
+        Number of bins along the largest side of the extent. The bins are square
+        so that the histograms keep the equal-axis layout of the pzmap.
+        extent : (xmin, xmax, ymin, ymax), optional
+        By default, the bounding box of the finite poles and zeros (and of the origin).
+        Returns
+        -------
+        dict with the bin centers "x", "y" and the counts "poles", "zeros" (nb_x x nb_y)
+        """
+    poles = np.ravel(np.asarray(poles, dtype=complex))
+    zeros = np.ravel(np.asarray(zeros, dtype=complex))
+    poles = poles[np.isfinite(poles)]
+    zeros = zeros[np.isfinite(zeros)]
+    if extent is None:
+        points = np.hstack((poles, zeros, [0]))
+        xmin, xmax = np.min(points.real), np.max(points.real)
+        ymin, ymax = np.min(points.imag), np.max(points.imag)
+        margin = 0.05 * max(xmax - xmin, ymax - ymin, 1e-3)
+        extent = (xmin - margin, xmax + margin, ymin - margin, ymax + margin)
+    xmin, xmax, ymin, ymax = extent
+
+    step = max(xmax - xmin, ymax - ymin) / bins
+    x_edges = xmin + step * np.arange(int(np.ceil((xmax - xmin) / step - 1e-9)) + 1)
+    y_edges = ymin + step * np.arange(int(np.ceil((ymax - ymin) / step - 1e-9)) + 1)
+
+    pole_counts, _, _ = np.histogram2d(poles.real, poles.imag, bins=(x_edges, y_edges))
+    zero_counts, _, _ = np.histogram2d(zeros.real, zeros.imag, bins=(x_edges, y_edges))
+    return {"x": (x_edges[:-1] + x_edges[1:]) / 2, "y": (y_edges[:-1] + y_edges[1:]) / 2, "poles": pole_counts, "zeros": zero_counts}
+
+
+def pz_density_traces(density, style="heatmap", label="sys"):
+    """Get the plotly traces of a pz_density result
+
+        With style="heatmap", the pole counts are rendered as a heatmap (empty bins are
+        transparent) and the zero counts as contour lines on top of it. With style="contour",
+        both are rendered as contour lines.
+        """
+    check_density_style(style)
+    hovertemplate = "<b>{}</b><br><b>real</b>: %{{x:.3f}}<br><b>imag</b>: %{{y:.3f}}<br><b>count</b>: %{{z}}<br>"
+    data = []
+    for key, colorscale in (("poles", "Blues"), ("zeros", "Reds")):
+        # plotly z is indexed as z[y][x]
+        counts = density[key].T
+        trace = {
+            "x": density["x"],
+            "y": density["y"],
+            "name": "{} ({})".format(label, key),
+            "colorscale": colorscale,
+            "hovertemplate": hovertemplate.format(key.capitalize()),
+        }
+        if style == "heatmap" and key == "poles":
+            trace.update({"type": "heatmap", "z": np.where(counts > 0, counts, np.nan), "colorbar": {"title": {"text": "poles"}}})
+        else:
+            trace.update({"type": "contour", "z": counts, "contours": {"coloring": "lines"}, "showscale": False})
+        data.append(trace)
+    return data
+
+
+def nichols_grid_levels(cl_mags=None, cl_phases=None):
+    """ Get the closed-loop magnitudes (dB) and phases (deg) of the Nichols chart contours """
     # Default chart size
     ol_phase_min = -359.99
     ol_phase_max = 0.0
@@ -87,13 +251,38 @@ def nichols_grid(cl_mags=None, cl_phases=None):
         cl_phases = np.array(cl_phases)
         assert (-360.0 < np.min(cl_phases)) and (np.max(cl_phases) < 0.0)
 
+    return cl_mags, cl_phases
+
+
+def nichols_grid(cl_mags=None, cl_phases=None, n_points=GRID_POINTS):
+    """Nichols chart grid
+        Parameters
+        ----------
+        cl_mags : array-like (dB), optional
+        Array of closed-loop magnitudes defining the iso-gain lines on a
+        custom Nichols chart.
+        cl_phases : array-like (degrees), optional
+        Array of closed-loop phases defining the iso-phase lines on a custom
+        Nichols chart. Must be in the range -360 < cl_phases < 0
+        n_points : int
+        Number of points of each contour.
+        Returns
+        -------
+        None
+        """
+    # Default chart size
+    ol_phase_min = -359.99
+    ol_phase_max = 0.0
+
+    cl_mags, cl_phases = nichols_grid_levels(cl_mags, cl_phases)
+
     # Find the M-contours
-    m = m_circles(cl_mags, phase_min=np.min(cl_phases), phase_max=np.max(cl_phases))
+    m = m_circles(cl_mags, phase_min=np.min(cl_phases), phase_max=np.max(cl_phases), n_points=n_points)
     m_mag = 20 * sp.log10(np.abs(m))
     m_phase = sp.mod(sp.degrees(sp.angle(m)), -360.0)  # Unwrap
 
     # Find the N-contours
-    n = n_circles(cl_phases, mag_min=np.min(cl_mags), mag_max=np.max(cl_mags))
+    n = n_circles(cl_phases, mag_min=np.min(cl_mags), mag_max=np.max(cl_mags), n_points=n_points)
     n_mag = 20 * sp.log10(np.abs(n))
     n_phase = sp.mod(sp.degrees(sp.angle(n)), -360.0)  # Unwrap
 
@@ -133,18 +322,103 @@ def closed_loop_contours(Gcl_mags, Gcl_phases):
     return Gcl / (1.0 - Gcl)
 
 
-def m_circles(mags, phase_min=-359.75, phase_max=-0.25):
-    phases = sp.radians(sp.linspace(phase_min, phase_max, 2000))
+def m_circles(mags, phase_min=-359.75, phase_max=-0.25, n_points=GRID_POINTS):
+    phases = sp.radians(sp.linspace(phase_min, phase_max, n_points))
     Gcl_mags, Gcl_phases = sp.meshgrid(10.0 ** (mags / 20.0), phases)
     return closed_loop_contours(Gcl_mags, Gcl_phases)
 
 
-def n_circles(phases, mag_min=-40.0, mag_max=12.0):
-    mags = sp.linspace(10 ** (mag_min / 20.0), 10 ** (mag_max / 20.0), 2000)
+def n_circles(phases, mag_min=-40.0, mag_max=12.0, n_points=GRID_POINTS):
+    mags = sp.linspace(10 ** (mag_min / 20.0), 10 ** (mag_max / 20.0), n_points)
     Gcl_phases, Gcl_mags = sp.meshgrid(sp.radians(phases), mags)
     return closed_loop_contours(Gcl_mags, Gcl_phases)
 
 
+def nichols_contour(cl_mag, cl_phase):
+    """ Get the open-loop phase (deg, in -360..0) and magnitude (dB) of closed-loop magnitudes (dB) and phases (deg) """
+    H = closed_loop_contours(10.0 ** (np.asarray(cl_mag) / 20.0), np.radians(cl_phase))
+    return np.mod(np.degrees(np.angle(H)), -360.0), 20 * np.log10(np.abs(H))
+
+
+def clip_contour(x, y, xlim, ylim):
+    """ Replace the points outside the viewport and the phase wrapping jumps by NaN (line breaks) """
+    outside = (x < xlim[0]) | (x > xlim[1]) | (y < ylim[0]) | (y > ylim[1])
+    # keep the first point outside on each side so that lines reach the border
+    visible = ~outside | np.hstack([False, ~outside[:-1]]) | np.hstack([~outside[1:], False])
+    jump = np.hstack([False, np.abs(np.diff(x)) > 180])
+    x = np.where(visible & ~jump, x, np.nan)
+    y = np.where(visible & ~jump, y, np.nan)
+    return x, y
+
+
+def nichols_grid_viewport(xlim, ylim, cl_mags=None, cl_phases=None, n_points=400, n_coarse=200):
+    """Nichols chart grid restricted to a viewport
+
+        Only the contour segments visible in the viewport are generated. Each contour
+        is first sampled coarsely, the coarse segments whose bounding box intersects the
+        viewport give its visible part, which is then resampled with n_points points, so
+        that the resolution follows the zoom level (even when the viewport lies between
+        two coarse samples). The N contours are sampled in dB.
+
+        Parameters
+        ----------
+        xlim : [phase_min, phase_max] (deg)
+        ylim : [mag_min, mag_max] (dB)
+        cl_mags, cl_phases : array-like, optional
+        See nichols_grid.
+        n_points : int
+        Number of points of the visible part of each contour copy.
+        Returns
+        -------
+        data_m_mag, data_n_mag : one dict per contour (all the visible 360 deg copies
+        are in the same trace, separated by NaN)
+        """
+    cl_mags, cl_phases = nichols_grid_levels(cl_mags, cl_phases)
+    cl_mags = np.unique(cl_mags)
+    x_margin = 0.02 * (xlim[1] - xlim[0])
+    y_margin = 0.02 * (ylim[1] - ylim[0])
+    xlim_clip = [xlim[0] - x_margin, xlim[1] + x_margin]
+    ylim_clip = [ylim[0] - y_margin, ylim[1] + y_margin]
+
+    # copies of the chart (contours span -360..0) overlapping the viewport
+    phase_offsets = 360.0 * np.arange(np.ceil(xlim[0] / 360.0), np.ceil(xlim[1] / 360.0) + 1)
+
+    # contours parametrized by the closed-loop phase (M) or magnitude in dB (N)
+    m_param = np.linspace(np.min(cl_phases), np.max(cl_phases), n_coarse)
+    n_param = np.linspace(np.min(cl_mags), np.max(cl_mags), n_coarse)
+    m_contour = lambda cl_mag, param: nichols_contour(cl_mag, param)
+    n_contour = lambda cl_phase, param: nichols_contour(param, cl_phase)
+
+    data = ([], [])
+    contours = (
+        (cl_mags, m_param, m_contour, "{} dB"),
+        (cl_phases, n_param, n_contour, "{} deg"),
+    )
+    for (levels, param, contour, name), data_contour in zip(contours, data):
+        for level in levels:
+            x_coarse, y_coarse = contour(level, param)
+            x_list, y_list = [], []
+            for phase_offset in phase_offsets:
+                x = x_coarse + phase_offset
+                # coarse segments whose bounding box intersects the viewport (phase wrapping jumps excluded)
+                with np.errstate(invalid="ignore"):
+                    x0, x1 = np.fmin(x[:-1], x[1:]), np.fmax(x[:-1], x[1:])
+                    y0, y1 = np.fmin(y_coarse[:-1], y_coarse[1:]), np.fmax(y_coarse[:-1], y_coarse[1:])
+                    visible = (x0 <= xlim_clip[1]) & (x1 >= xlim_clip[0]) & (y0 <= ylim_clip[1]) & (y1 >= ylim_clip[0]) & (x1 - x0 <= 180)
+                index = np.nonzero(visible)[0]
+                if len(index) == 0:
+                    continue
+                # resample the visible part of the contour
+                param_fine = np.linspace(param[index[0]], param[index[-1] + 1], n_points)
+                x_fine, y_fine = contour(level, param_fine)
+                x_fine, y_fine = clip_contour(x_fine + phase_offset, y_fine, xlim_clip, ylim_clip)
+                x_list += [x_fine, [np.nan]]
+                y_list += [y_fine, [np.nan]]
+            data_contour.append({"x": np.hstack(x_list + [[]]), "y": np.hstack(y_list + [[]]), "name": name.format(level)})
+
+    return data
+
+
 # ROOT LOCUS (comes from the python control lib)
 
 def _default_zetas(xlim, ylim):
@@ -0,0 +1,34 @@
+import numpy as np
+import scipy.linalg
+import control as ctl
+from lib.analysis import as_analysis
+from lib.discretize import c2d_batch, EIG_COND_MAX
+
+TE_LIST = [0.01, 0.1, 0.5, 2]
+
+
+def assert_matches_c2d(G):
+    batch = c2d_batch(G, TE_LIST)
+    for Te, Gd in batch:
+        expected = ctl.c2d(G, Te, "zoh")
+        assert Gd.dt == Te
+        # compare the responses on the unit circle (the coefficients may be scaled differently)
+        z = np.exp(1j * np.linspace(0.05, np.pi, 20))
+        response = np.array([Gd.horner(z_k)[0, 0] for z_k in z]).ravel()
+        expected_response = np.array([expected.horner(z_k)[0, 0] for z_k in z]).ravel()
+        assert np.allclose(response, expected_response, rtol=1e-6, atol=1e-9)
+
+
+def test_integrator():
+    assert_matches_c2d(ctl.tf([1], [1, 1, 0]))
+
+
+def test_repeated_pole_expm_fallback():
+    G = ctl.tf([1], [1, 2, 1])
+    _, V = scipy.linalg.eig(np.asarray(as_analysis(G).ss.A, dtype=float))
+    assert np.linalg.cond(V) >= EIG_COND_MAX
+    assert_matches_c2d(G)
+
+
+def test_direct_feedthrough():
+    assert_matches_c2d(ctl.tf([2, 1], [1, 3]))
@@ -0,0 +1,20 @@
+import numpy as np
+import control as ctl
+from lib.loop import loop_analysis
+
+
+def test_scalar_controller():
+    P = ctl.tf([1], [1, 2, 1])
+    w = np.logspace(-2, 2, 50)
+    result = loop_analysis(P, 2, w)
+    expected = loop_analysis(P, ctl.tf([2], [1]), w)
+    for name in ("S", "T", "KS", "PS"):
+        assert np.allclose(result[name], expected[name])
+    assert np.allclose(result["S"], 1 / (1 + 2 * (1 / (1j * w + 1) ** 2)))
+
+
+def test_discrete_scalar_controller():
+    P = ctl.tf([0.1], [1, -0.9], 0.1)
+    result = loop_analysis(P, 3)
+    z = np.exp(1j * result["w"] * 0.1)
+    assert np.allclose(result["T"], 0.3 / (z - 0.9 + 0.3))
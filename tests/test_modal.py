@@ -0,0 +1,24 @@
+import numpy as np
+import control as ctl
+from scipy import signal
+from lib.modal import Modal_Response
+
+
+def test_close_fast_poles_are_distinct():
+    T = np.linspace(0, 0.02, 200)
+    for poles in ([-1000, -1000.5], [-1000 + 0.4j, -1000 - 0.4j]):
+        den = np.real(np.poly(poles))
+        tf = ctl.tf([1e6], den)
+        response = Modal_Response(tf, "step")
+        assert np.all(response.powers == 1)
+        _, y = signal.step(signal.lti([1e6], den), T=T)
+        assert np.allclose(response(T), y, atol=1e-6)
+
+
+def test_repeated_poles():
+    tf = ctl.tf([1], np.poly([-1, -1, -2]))
+    response = Modal_Response(tf, "impulse")
+    T = np.linspace(0, 10, 100)
+    _, y = signal.impulse(signal.lti([1], np.poly([-1, -1, -2])), T=T)
+    assert sorted(response.powers) == [1, 1, 2]
+    assert np.allclose(response(T), y, atol=1e-6)
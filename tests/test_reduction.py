@@ -0,0 +1,40 @@
+import numpy as np
+import control as ctl
+from lib.reduction import balanced_truncation
+
+
+def response(sys, x):
+    return np.polyval(sys.num[0][0], x) / np.polyval(sys.den[0][0], x)
+
+
+def max_error(G, Gr, w):
+    x = 1j * w if ctl.isctime(G) else np.exp(1j * w * G.dt)
+    return np.max(np.abs(response(G, x) - response(Gr, x)))
+
+
+STABLE = ctl.tf([1, 3], [1, 1]) * ctl.tf([1], [1, 0.5, 4]) * ctl.tf([10], [1, 10]) * ctl.tf([100], [1, 2, 100])
+
+
+def test_error_bound():
+    w = np.logspace(-3, 3, 5000)
+    for order in (2, 3, 4):
+        result = balanced_truncation(STABLE, order=order)
+        assert result["order"] == order
+        assert max_error(STABLE, result["sys"], w) <= result["error_bound"] * (1 + 1e-6)
+
+
+def test_unstable_mode_kept():
+    G = STABLE * ctl.tf([1], [1, -1])
+    result = balanced_truncation(G, order=3)
+    assert np.min(np.abs(result["sys"].pole() - 1)) < 1e-6
+    assert max_error(G, result["sys"], np.logspace(-3, 3, 5000)) <= result["error_bound"] * (1 + 1e-6)
+
+
+def test_discrete_integrator_kept():
+    Te = 0.05
+    G = ctl.c2d(STABLE, Te, "zoh") * ctl.tf([Te], [1, -1], Te)
+    result = balanced_truncation(G, order=3)
+    assert result["sys"].dt == Te
+    assert np.min(np.abs(result["sys"].pole() - 1)) < 1e-6
+    w = np.logspace(-2, np.log10(np.pi / Te), 5000)
+    assert max_error(G, result["sys"], w) <= result["error_bound"] * (1 + 1e-6)
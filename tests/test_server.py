@@ -0,0 +1,45 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from lib.server import Figure_Server
+
+REQUEST = {"type": "bode", "num": [1], "den": [1, 2, 1], "label": "sys"}
+
+
+async def post(port, body):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    header = "POST /figure HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n"
+    writer.write(header.format(len(body)).encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    status_line, _, content = response.partition(b"\r\n\r\n")
+    return int(status_line.split()[1]), content.decode()
+
+
+async def run_requests():
+    server = await Figure_Server(port=0, executor=ThreadPoolExecutor(2)).start()
+    try:
+        body = json.dumps(REQUEST).encode()
+        first, second = await asyncio.gather(post(server.port, body), post(server.port, body))
+        stats_after_pair = dict(server.stats)
+        third = await post(server.port, body)
+        unknown_type = await post(server.port, json.dumps(dict(REQUEST, type="sankey")).encode())
+        invalid_json = await post(server.port, b"{\"type\": ")
+    finally:
+        await server.close()
+    return first, second, stats_after_pair, third, unknown_type, invalid_json, server.stats
+
+
+def test_coalescing_cache_and_errors():
+    first, second, stats_after_pair, third, unknown_type, invalid_json, stats = asyncio.run(run_requests())
+    assert first[0] == second[0] == 200
+    assert first[1] == second[1]
+    assert stats_after_pair["computed"] == 1
+    assert stats_after_pair["coalesced"] == 1
+    assert third == first
+    assert stats["cache_hits"] == 1
+    assert stats["computed"] == 1
+    assert unknown_type[0] == 400
+    assert invalid_json[0] == 400
+    assert "error" in json.loads(invalid_json[1])